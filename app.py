@@ -11,8 +11,45 @@ def hello():
 def health():
     return "OK"
 
+def create_app(config_name=None, test_config=None):
+    """
+    Build the full media service: config, database, services and routes
+    
+    Args:
+        config_name: Key into config.settings.config, defaults to FLASK_ENV
+        test_config: Extra settings applied before any extension reads them
+    
+    Returns:
+        Flask: Configured application
+    """
+    from config.settings import config
+    from models import db
+    from routes.admin import admin_bp
+    from routes.health import health_bp
+    from routes.media import media_bp
+    from routes.upload import upload_bp
+    from services import init_services
+    
+    config_name = config_name or os.getenv('FLASK_ENV', 'default')
+    
+    service_app = Flask(__name__)
+    service_app.config.from_object(config[config_name]())
+    if test_config:
+        service_app.config.update(test_config)
+    
+    os.makedirs(service_app.config['UPLOAD_FOLDER'], exist_ok=True)
+    
+    db.init_app(service_app)
+    init_services(service_app)
+    
+    service_app.register_blueprint(health_bp)
+    service_app.register_blueprint(admin_bp)
+    service_app.register_blueprint(upload_bp, url_prefix='/api/media')
+    service_app.register_blueprint(media_bp, url_prefix='/api/media')
+    
+    return service_app
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8005))
     print(f"Starting app on port {port}")
     app.run(host='0.0.0.0', port=port)
-
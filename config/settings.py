@@ -51,16 +51,20 @@ class Config:
     # Other Services
     TELEGIVE_AUTH_URL = os.getenv('TELEGIVE_AUTH_URL', 'https://telegive-auth.railway.app')
     TELEGIVE_GIVEAWAY_URL = os.getenv('TELEGIVE_GIVEAWAY_URL', 'https://telegive-service.railway.app')
+    TELEGIVE_HTTP2 = os.getenv('TELEGIVE_HTTP2', 'false').lower() == 'true'
     
     # File Processing
     IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 85))
     VIDEO_VALIDATION_ENABLED = os.getenv('VIDEO_VALIDATION_ENABLED', 'true').lower() == 'true'
     HASH_ALGORITHM = os.getenv('HASH_ALGORITHM', 'sha256')
+    VALIDATION_WORKERS = int(os.getenv('VALIDATION_WORKERS', min(32, (os.cpu_count() or 1) * 5)))
     
     # Cleanup Configuration
     CLEANUP_DELAY_MINUTES = int(os.getenv('CLEANUP_DELAY_MINUTES', 5))
     CLEANUP_BATCH_SIZE = int(os.getenv('CLEANUP_BATCH_SIZE', 100))
+    CLEANUP_CHUNK_SIZE = int(os.getenv('CLEANUP_CHUNK_SIZE', 500))
     CLEANUP_RETRY_ATTEMPTS = int(os.getenv('CLEANUP_RETRY_ATTEMPTS', 3))
+    MAINTENANCE_DELETE_BATCH_SIZE = int(os.getenv('MAINTENANCE_DELETE_BATCH_SIZE', 1000))
     
     # CDN Configuration (optional)
     CDN_ENABLED = os.getenv('CDN_ENABLED', 'false').lower() == 'true'
@@ -72,6 +76,7 @@ class Config:
     
     # Security
     SECURITY_SCAN_ENABLED = os.getenv('SECURITY_SCAN_ENABLED', 'false').lower() == 'true'
+    SECURITY_SCAN_PROCESSES = int(os.getenv('SECURITY_SCAN_PROCESSES', min(4, os.cpu_count() or 1)))
     
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -0,0 +1,4 @@
+-- Stat of each file at its last passing integrity check. Validation skips
+-- re-hashing while the file's mtime and size still match
+ALTER TABLE media_files ADD COLUMN file_mtime_ns BIGINT;
+ALTER TABLE media_files ADD COLUMN file_size_validated BIGINT;
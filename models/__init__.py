@@ -31,13 +31,11 @@ def create_indexes():
     """Create database indexes"""
     try:
         # These indexes are already defined in the models via index=True
-        # This function is for any additional custom indexes
-        
-        # Example of creating a composite index
-        # db.engine.execute('''
-        #     CREATE INDEX IF NOT EXISTS idx_media_files_account_giveaway 
-        #     ON media_files(account_id, giveaway_id)
-        # ''')
+        # or __table_args__; create_all skips them on existing tables, so
+        # create any that are missing here
+        for table in (MediaFile.__table__, FileValidationLog.__table__, FileCleanupLog.__table__):
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
         
         db.session.commit()
     except Exception as e:
@@ -1,7 +1,6 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from . import db
 
 class FileCleanupLog(db.Model):
     """File cleanup log table"""
@@ -9,7 +8,7 @@ class FileCleanupLog(db.Model):
     __tablename__ = 'file_cleanup_log'
     
     # Primary key
-    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)  # SQLite only autoincrements INTEGER keys
     
     # Foreign key
     media_file_id = db.Column(db.BigInteger, db.ForeignKey('media_files.id'), nullable=False, index=True)
@@ -19,7 +18,7 @@ class FileCleanupLog(db.Model):
     cleanup_success = db.Column(db.Boolean, nullable=False)
     error_message = db.Column(db.Text, nullable=True)
     file_size_freed = db.Column(db.BigInteger, nullable=True)
-    cleanup_timestamp = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    cleanup_timestamp = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow, index=True)
     
     def __init__(self, **kwargs):
         super(FileCleanupLog, self).__init__(**kwargs)
@@ -1,15 +1,24 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from . import db
 
 class MediaFile(db.Model):
     """Media files table - primary responsibility of this service"""
     
     __tablename__ = 'media_files'
+    __table_args__ = (
+        # Covers the scheduled cleanup query
+        db.Index('idx_media_files_cleanup_schedule', 'cleanup_status', 'cleanup_scheduled_at', 'is_active'),
+        # Partial index over files still awaiting validation
+        db.Index(
+            'idx_media_files_pending_validation', 'id',
+            postgresql_where=db.text('is_validated = false AND is_active = true'),
+            sqlite_where=db.text('is_validated = 0 AND is_active = 1')
+        ),
+    )
     
     # Primary key
-    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)  # SQLite only autoincrements INTEGER keys
     
     # Foreign keys
     account_id = db.Column(db.BigInteger, nullable=False, index=True)
@@ -46,6 +55,10 @@ class MediaFile(db.Model):
     is_validated = db.Column(db.Boolean, nullable=False, default=False)
     validation_error = db.Column(db.Text, nullable=True)
     
+    # File stat at the last successful hash check; lets revalidation skip re-hashing
+    file_mtime_ns = db.Column(db.BigInteger, nullable=True)
+    file_size_validated = db.Column(db.BigInteger, nullable=True)
+    
     # Relationships
     validation_logs = db.relationship('FileValidationLog', backref='media_file', lazy='dynamic', cascade='all, delete-orphan')
     cleanup_logs = db.relationship('FileCleanupLog', backref='media_file', lazy='dynamic', cascade='all, delete-orphan')
@@ -1,8 +1,7 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.dialects.postgresql import JSONB
 
-db = SQLAlchemy()
+from . import db
 
 class FileValidationLog(db.Model):
     """File validation log table"""
@@ -10,7 +9,7 @@ class FileValidationLog(db.Model):
     __tablename__ = 'file_validation_log'
     
     # Primary key
-    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)  # SQLite only autoincrements INTEGER keys
     
     # Foreign key
     media_file_id = db.Column(db.BigInteger, db.ForeignKey('media_files.id'), nullable=False, index=True)
@@ -20,7 +19,7 @@ class FileValidationLog(db.Model):
     validation_result = db.Column(db.Boolean, nullable=False)
     error_message = db.Column(db.Text, nullable=True)
     validation_details = db.Column(JSONB, nullable=True)
-    validated_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    validated_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow, index=True)
     
     def __init__(self, **kwargs):
         super(FileValidationLog, self).__init__(**kwargs)
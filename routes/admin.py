@@ -290,3 +290,29 @@ def admin_health_check():
             'error_code': 'HEALTH_CHECK_FAILED'
         }), 500
 
+
+@admin_bp.route('/admin/scheduler/workers', methods=['PUT'])
+def set_scheduler_workers():
+    """Resize the task scheduler's worker pool at runtime"""
+    from tasks import task_scheduler
+    
+    data = request.get_json(silent=True) or {}
+    max_workers = data.get('max_workers')
+    
+    if not isinstance(max_workers, int) or isinstance(max_workers, bool) or max_workers < 1:
+        return jsonify({
+            'success': False,
+            'error': 'max_workers must be a positive integer',
+            'error_code': 'INVALID_WORKER_COUNT'
+        }), 400
+    
+    result = task_scheduler.set_max_workers(max_workers)
+    
+    if not result['success']:
+        logger.error(f"Scheduler resize failed: {result['error']}")
+        return jsonify({
+            **result,
+            'error_code': 'SCHEDULER_RESIZE_FAILED'
+        }), 409 if task_scheduler.scheduler is None else 500
+    
+    return jsonify(result), 200
@@ -3,97 +3,56 @@
 Database management and migration system for Media Management Service
 """
 
+import hashlib
+import io
 import os
+import re
+import shutil
+import subprocess
 import sys
 import logging
 from datetime import datetime
-from sqlalchemy import create_engine, text, MetaData
+from typing import Sequence
+from sqlalchemy import create_engine, text, inspect, MetaData
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
 import json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class DatabaseManager:
-    """Database management and migration system"""
-    
-    def __init__(self, database_url: str):
-        self.database_url = database_url
-        self.engine = create_engine(database_url)
-        self.migrations_table = 'schema_migrations'
-    
-    def ensure_migrations_table(self):
-        """Ensure migrations tracking table exists"""
-        try:
-            with self.engine.connect() as conn:
-                if 'postgresql' in self.database_url:
-                    conn.execute(text(f"""
-                        CREATE TABLE IF NOT EXISTS {self.migrations_table} (
-                            id SERIAL PRIMARY KEY,
-                            version VARCHAR(255) UNIQUE NOT NULL,
-                            name VARCHAR(255) NOT NULL,
-                            applied_at TIMESTAMP DEFAULT NOW(),
-                            checksum VARCHAR(64)
-                        )
-                    """))
-                else:  # SQLite
-                    conn.execute(text(f"""
-                        CREATE TABLE IF NOT EXISTS {self.migrations_table} (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            version VARCHAR(255) UNIQUE NOT NULL,
-                            name VARCHAR(255) NOT NULL,
-                            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            checksum VARCHAR(64)
-                        )
-                    """))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Failed to create migrations table: {e}")
-            raise
+# Migration files are named <version>_<name>.sql
+_MIGRATION_RE = re.compile(r'^(\d+)_(.+)\.sql$')
+
+_MIGRATIONS_TABLE = 'schema_migrations'
+
+# Migrations that only add columns, as version -> (table, columns). A schema
+# built by db.create_all already has them, so when every column is present
+# the migration is recorded as applied instead of run
+_ADDED_COLUMNS = {
+    '002': ('media_files', ('file_mtime_ns', 'file_size_validated')),
+}
+
+class _PGDialect:
+    """PostgreSQL-specific SQL for DatabaseManager"""
     
-    def get_applied_migrations(self) -> set:
-        """Get list of applied migrations"""
-        try:
-            with self.engine.connect() as conn:
-                result = conn.execute(text(f"SELECT version FROM {self.migrations_table}"))
-                return {row[0] for row in result}
-        except Exception:
-            return set()
+    MIGRATIONS_DDL = text(f"""
+        CREATE TABLE IF NOT EXISTS {_MIGRATIONS_TABLE} (
+            id SERIAL PRIMARY KEY,
+            version VARCHAR(255) UNIQUE NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT NOW(),
+            checksum VARCHAR(64)
+        )
+    """)
     
-    def apply_migration(self, version: str, name: str, sql: str):
-        """Apply a single migration"""
-        try:
-            with self.engine.connect() as conn:
-                # Apply migration SQL
-                for statement in sql.split(';'):
-                    statement = statement.strip()
-                    if statement:
-                        conn.execute(text(statement))
-                
-                # Record migration
-                if 'postgresql' in self.database_url:
-                    conn.execute(text(f"""
-                        INSERT INTO {self.migrations_table} (version, name, applied_at)
-                        VALUES (:version, :name, NOW())
-                    """), {"version": version, "name": name})
-                else:  # SQLite
-                    conn.execute(text(f"""
-                        INSERT INTO {self.migrations_table} (version, name, applied_at)
-                        VALUES (:version, :name, CURRENT_TIMESTAMP)
-                    """), {"version": version, "name": name})
-                
-                conn.commit()
-                logger.info(f"Applied migration {version}: {name}")
-                
-        except Exception as e:
-            logger.error(f"Failed to apply migration {version}: {e}")
-            raise
+    INSERT_MIGRATION = text(f"""
+        INSERT INTO {_MIGRATIONS_TABLE} (version, name, checksum, applied_at)
+        VALUES (:version, :name, :checksum, NOW())
+    """)
     
-    def create_initial_schema(self):
-        """Create initial database schema"""
-        if 'postgresql' in self.database_url:
-            initial_sql = """
-            -- Initial schema for Media Management Service (PostgreSQL)
+    INITIAL_SCHEMA = (
+        """
             CREATE TABLE IF NOT EXISTS media_files (
                 id BIGSERIAL PRIMARY KEY,
                 account_id BIGINT NOT NULL,
@@ -106,10 +65,13 @@ class DatabaseManager:
                 metadata JSONB,
                 is_active BOOLEAN DEFAULT TRUE,
                 cleanup_status VARCHAR(50) DEFAULT 'pending',
+                file_mtime_ns BIGINT,
+                file_size_validated BIGINT,
                 created_at TIMESTAMPTZ DEFAULT NOW(),
                 updated_at TIMESTAMPTZ DEFAULT NOW()
-            );
-            
+            )
+        """,
+        """
             CREATE TABLE IF NOT EXISTS file_validation_logs (
                 id BIGSERIAL PRIMARY KEY,
                 media_file_id BIGINT REFERENCES media_files(id),
@@ -117,8 +79,9 @@ class DatabaseManager:
                 is_valid BOOLEAN NOT NULL,
                 validation_details JSONB,
                 created_at TIMESTAMPTZ DEFAULT NOW()
-            );
-            
+            )
+        """,
+        """
             CREATE TABLE IF NOT EXISTS file_cleanup_logs (
                 id BIGSERIAL PRIMARY KEY,
                 media_file_id BIGINT REFERENCES media_files(id),
@@ -127,19 +90,52 @@ class DatabaseManager:
                 file_size_freed BIGINT DEFAULT 0,
                 cleanup_details JSONB,
                 created_at TIMESTAMPTZ DEFAULT NOW()
-            );
-            
-            -- Indexes
-            CREATE INDEX IF NOT EXISTS idx_media_files_account_id ON media_files(account_id);
-            CREATE INDEX IF NOT EXISTS idx_media_files_file_hash ON media_files(file_hash);
-            CREATE INDEX IF NOT EXISTS idx_media_files_is_active ON media_files(is_active);
-            CREATE INDEX IF NOT EXISTS idx_media_files_created_at ON media_files(created_at);
-            CREATE INDEX IF NOT EXISTS idx_validation_logs_media_file_id ON file_validation_logs(media_file_id);
-            CREATE INDEX IF NOT EXISTS idx_cleanup_logs_media_file_id ON file_cleanup_logs(media_file_id);
-            """
-        else:  # SQLite
-            initial_sql = """
-            -- Initial schema for Media Management Service (SQLite)
+            )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_media_files_account_id ON media_files(account_id)",
+        "CREATE INDEX IF NOT EXISTS idx_media_files_file_hash ON media_files(file_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_media_files_is_active ON media_files(is_active)",
+        "CREATE INDEX IF NOT EXISTS idx_media_files_created_at ON media_files(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_validation_logs_media_file_id ON file_validation_logs(media_file_id)",
+        "CREATE INDEX IF NOT EXISTS idx_cleanup_logs_media_file_id ON file_cleanup_logs(media_file_id)",
+    )
+    
+    @staticmethod
+    def record_migrations(conn, rows):
+        """Bulk-load migration rows with COPY FROM STDIN"""
+        buffer = io.StringIO('\n'.join('\t'.join(row) for row in rows))
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_from(buffer, _MIGRATIONS_TABLE, columns=('version', 'name', 'checksum'))
+        finally:
+            cursor.close()
+    
+    @staticmethod
+    def drop_all(conn):
+        """Drop every table; FK ordering is handled server-side"""
+        conn.exec_driver_sql("DROP SCHEMA public CASCADE")
+        conn.exec_driver_sql("CREATE SCHEMA public")
+
+class _SQLiteDialect:
+    """SQLite-specific SQL for DatabaseManager"""
+    
+    MIGRATIONS_DDL = text(f"""
+        CREATE TABLE IF NOT EXISTS {_MIGRATIONS_TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            version VARCHAR(255) UNIQUE NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            checksum VARCHAR(64)
+        )
+    """)
+    
+    INSERT_MIGRATION = text(f"""
+        INSERT INTO {_MIGRATIONS_TABLE} (version, name, checksum, applied_at)
+        VALUES (:version, :name, :checksum, CURRENT_TIMESTAMP)
+    """)
+    
+    INITIAL_SCHEMA = (
+        """
             CREATE TABLE IF NOT EXISTS media_files (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 account_id INTEGER NOT NULL,
@@ -152,10 +148,13 @@ class DatabaseManager:
                 metadata TEXT,
                 is_active BOOLEAN DEFAULT 1,
                 cleanup_status VARCHAR(50) DEFAULT 'pending',
+                file_mtime_ns INTEGER,
+                file_size_validated INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            
+            )
+        """,
+        """
             CREATE TABLE IF NOT EXISTS file_validation_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 media_file_id INTEGER REFERENCES media_files(id),
@@ -163,8 +162,9 @@ class DatabaseManager:
                 is_valid BOOLEAN NOT NULL,
                 validation_details TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            
+            )
+        """,
+        """
             CREATE TABLE IF NOT EXISTS file_cleanup_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 media_file_id INTEGER REFERENCES media_files(id),
@@ -173,21 +173,160 @@ class DatabaseManager:
                 file_size_freed INTEGER DEFAULT 0,
                 cleanup_details TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
+            )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_media_files_account_id ON media_files(account_id)",
+        "CREATE INDEX IF NOT EXISTS idx_media_files_file_hash ON media_files(file_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_media_files_is_active ON media_files(is_active)",
+        "CREATE INDEX IF NOT EXISTS idx_media_files_created_at ON media_files(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_validation_logs_media_file_id ON file_validation_logs(media_file_id)",
+        "CREATE INDEX IF NOT EXISTS idx_cleanup_logs_media_file_id ON file_cleanup_logs(media_file_id)",
+    )
+    
+    @staticmethod
+    def record_migrations(conn, rows):
+        """Bulk-insert migration rows with executemany"""
+        conn.exec_driver_sql(
+            f"INSERT INTO {_MIGRATIONS_TABLE} (version, name, checksum) VALUES (?, ?, ?)",
+            rows
+        )
+    
+    @staticmethod
+    def drop_all(conn):
+        """Drop every user table in a single transaction"""
+        tables = conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+        ).scalars().all()
+        for table in tables:
+            conn.exec_driver_sql(f'DROP TABLE IF EXISTS "{table}"')
+
+class DatabaseManager:
+    """Database management and migration system"""
+    
+    def __init__(self, database_url: str, script_mode: bool = True):
+        self.database_url = database_url
+        self.script_mode = script_mode
+        self.engine = self._create_engine(database_url, script_mode)
+        self.migrations_table = _MIGRATIONS_TABLE
+        self.dialect = _PGDialect if 'postgresql' in database_url else _SQLiteDialect
+    
+    @staticmethod
+    def _create_engine(database_url: str, script_mode: bool):
+        """Create engine with pooling suited to the calling context"""
+        if script_mode:
+            # CLI runs issue a handful of statements - skip pool bookkeeping
+            return create_engine(database_url, poolclass=NullPool, future=True)
+        
+        if database_url.startswith('sqlite'):
+            # SQLite pools do not accept sizing arguments
+            return create_engine(database_url, pool_pre_ping=True, future=True)
+        
+        return create_engine(
+            database_url,
+            pool_size=10,
+            max_overflow=20,
+            pool_timeout=30,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+            future=True
+        )
+    
+    @staticmethod
+    def _checksum(sql: str) -> str:
+        """SHA-256 of a migration's SQL, as stored in the migrations table"""
+        return hashlib.sha256(sql.encode()).hexdigest()
+    
+    def ensure_migrations_table(self):
+        """Ensure migrations tracking table exists"""
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(self.dialect.MIGRATIONS_DDL)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to create migrations table: {e}")
+            raise
+    
+    def get_applied_migrations(self) -> dict:
+        """Get applied migrations as a mapping of version to checksum"""
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execute(text(f"SELECT version, checksum FROM {self.migrations_table}"))
+                return {row[0]: row[1] for row in result}
+        except Exception:
+            return {}
+    
+    def apply_migration(self, version: str, name: str, sql: str = None,
+                        statements: Sequence[str] = None):
+        """
+        Apply a single migration
+        
+        Args:
+            version: Migration version
+            name: Migration name
+            sql: Raw SQL script, split on ';' before execution
+            statements: Pre-split SQL statements, executed as-is
+        """
+        if statements is None:
+            statements = [statement.strip() for statement in sql.split(';') if statement.strip()]
+        else:
+            sql = ';\n'.join(statements)
+        
+        checksum = self._checksum(sql)
+        
+        try:
+            with self.engine.connect() as conn:
+                # Apply migration SQL
+                for statement in statements:
+                    conn.execute(text(statement))
+                
+                # Record migration
+                conn.execute(
+                    self.dialect.INSERT_MIGRATION,
+                    {"version": version, "name": name, "checksum": checksum}
+                )
+                
+                conn.commit()
+                logger.info(f"Applied migration {version}: {name}")
+                
+        except Exception as e:
+            logger.error(f"Failed to apply migration {version}: {e}")
+            raise
+    
+    def record_migrations_bulk(self, rows: list):
+        """
+        Record many migrations as applied in a single round-trip
+        
+        Args:
+            rows: List of (version, name, checksum) tuples
+        """
+        if not rows:
+            return
+        
+        try:
+            with self.engine.begin() as conn:
+                self.dialect.record_migrations(conn, rows)
+            
+            logger.info(f"Recorded {len(rows)} migrations as applied")
             
-            -- Indexes
-            CREATE INDEX IF NOT EXISTS idx_media_files_account_id ON media_files(account_id);
-            CREATE INDEX IF NOT EXISTS idx_media_files_file_hash ON media_files(file_hash);
-            CREATE INDEX IF NOT EXISTS idx_media_files_is_active ON media_files(is_active);
-            CREATE INDEX IF NOT EXISTS idx_media_files_created_at ON media_files(created_at);
-            CREATE INDEX IF NOT EXISTS idx_validation_logs_media_file_id ON file_validation_logs(media_file_id);
-            CREATE INDEX IF NOT EXISTS idx_cleanup_logs_media_file_id ON file_cleanup_logs(media_file_id);
-            """
+        except Exception as e:
+            logger.error(f"Failed to record migrations: {e}")
+            raise
+    
+    def _columns_present(self, version: str) -> bool:
+        """Whether a column-adding migration's columns already exist"""
+        if version not in _ADDED_COLUMNS:
+            return False
         
+        table, columns = _ADDED_COLUMNS[version]
+        existing = {column['name'] for column in inspect(self.engine).get_columns(table)}
+        return existing.issuperset(columns)
+    
+    def create_initial_schema(self):
+        """Create initial database schema"""
         self.apply_migration(
             version="001",
             name="initial_schema",
-            sql=initial_sql
+            statements=self.dialect.INITIAL_SCHEMA
         )
     
     def run_migrations(self, migrations_dir: str = "migrations"):
@@ -195,30 +334,64 @@ class DatabaseManager:
         self.ensure_migrations_table()
         applied_migrations = self.get_applied_migrations()
         
-        if not os.path.exists(migrations_dir):
-            logger.info("No migrations directory found, creating initial schema")
-            self.create_initial_schema()
-            return
-        
-        # Get all migration files
-        migration_files = []
-        for filename in os.listdir(migrations_dir):
-            if filename.endswith('.sql'):
-                version = filename.split('_')[0]
-                migration_files.append((version, filename))
+        # Collect migrations that have not been applied yet, and refuse to
+        # run if an applied one was edited since
+        pending = []
+        if os.path.exists(migrations_dir):
+            with os.scandir(migrations_dir) as entries:
+                for entry in entries:
+                    match = _MIGRATION_RE.match(entry.name)
+                    if not match:
+                        continue
+                    
+                    version = match.group(1)
+                    with open(entry.path, 'r') as f:
+                        sql = f.read()
+                    
+                    if version not in applied_migrations:
+                        pending.append((version, match.group(2), sql))
+                        continue
+                    
+                    # Rows recorded before checksums were stored have none
+                    applied_checksum = applied_migrations[version]
+                    if applied_checksum is not None and applied_checksum != self._checksum(sql):
+                        logger.error(f"Migration {version} was modified after it was applied")
+                        raise RuntimeError(f"Checksum mismatch for applied migration {entry.name}")
         
         # Sort by version
-        migration_files.sort(key=lambda x: x[0])
+        pending.sort(key=lambda x: x[0])
+        
+        if not applied_migrations:
+            if inspect(self.engine).has_table('media_files'):
+                # Schema created outside the migration system (e.g. db.create_all) -
+                # adopt it at the initial schema and apply the migrations after it
+                logger.info("Existing schema detected, recording initial schema without applying it")
+                initial_sql = ';\n'.join(self.dialect.INITIAL_SCHEMA)
+                self.record_migrations_bulk([("001", "initial_schema", self._checksum(initial_sql))])
+            else:
+                # Fresh database - INITIAL_SCHEMA tracks the models, so the
+                # numbered migrations are already part of it
+                logger.info("Creating initial schema")
+                self.create_initial_schema()
+                self.record_migrations_bulk([
+                    (version, name, self._checksum(sql)) for version, name, sql in pending
+                ])
+                return
+            
+            pending = [migration for migration in pending if migration[0] != "001"]
+        
+        if not pending:
+            logger.info("Database schema is up to date")
+            return
         
         # Apply pending migrations
-        for version, filename in migration_files:
-            if version not in applied_migrations:
-                filepath = os.path.join(migrations_dir, filename)
-                with open(filepath, 'r') as f:
-                    sql = f.read()
-                
-                name = filename.replace('.sql', '').replace(f'{version}_', '')
-                self.apply_migration(version, name, sql)
+        for version, name, sql in pending:
+            if self._columns_present(version):
+                logger.info(f"Migration {version} columns already exist, recording it as applied")
+                self.record_migrations_bulk([(version, name, self._checksum(sql))])
+                continue
+            
+            self.apply_migration(version, name, sql)
     
     def check_connection(self) -> bool:
         """Check database connection"""
@@ -258,7 +431,26 @@ class DatabaseManager:
     def backup_schema(self, output_file: str):
         """Backup database schema"""
         try:
-            # This is a simplified backup - in production, use pg_dump
+            # Prefer a canonical, restorable dump when pg_dump is available
+            if self.dialect is _PGDialect and shutil.which('pg_dump'):
+                # pg_dump does not understand SQLAlchemy driver suffixes (postgresql+psycopg2).
+                # The password goes through the environment, not argv, where
+                # any local user could read it from the process list
+                url = self.engine.url
+                dump_url = url.set(drivername='postgresql', password=None).render_as_string()
+                env = dict(os.environ)
+                if url.password is not None:
+                    env['PGPASSWORD'] = url.password
+                
+                subprocess.run(
+                    ['pg_dump', '--schema-only', '--no-owner', '-f', output_file, dump_url],
+                    check=True,
+                    env=env
+                )
+                logger.info(f"Schema backup saved to {output_file} (pg_dump)")
+                return
+            
+            # Fallback: simplified JSON backup via reflection
             metadata = MetaData()
             metadata.reflect(bind=self.engine)
             
@@ -290,15 +482,15 @@ class DatabaseManager:
             logger.error(f"Schema backup failed: {e}")
             raise
     
-    def reset_database(self):
+    def reset_database(self, migrations_dir: str = "migrations"):
         """Reset database (DANGER: This will delete all data)"""
         try:
-            metadata = MetaData()
-            metadata.reflect(bind=self.engine)
-            metadata.drop_all(bind=self.engine)
+            with self.engine.begin() as conn:
+                self.dialect.drop_all(conn)
             
-            # Recreate schema
-            self.create_initial_schema()
+            # Recreate schema through the fresh-database path, which also
+            # records the shipped migrations INITIAL_SCHEMA already includes
+            self.run_migrations(migrations_dir)
             
             logger.info("Database reset completed")
             
@@ -8,6 +8,8 @@ import time
 import sys
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional
 
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +23,30 @@ class PostDeploymentVerifier:
         self.timeout = timeout
         self.session = requests.Session()
         self.session.timeout = 10
+        
+        # Allow concurrent endpoint checks to reuse pooled connections
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def _fetch_endpoints(self, endpoints: List[tuple]) -> List[tuple]:
+        """
+        Issue GET requests for all endpoints concurrently
+        
+        Args:
+            endpoints: List of tuples whose first element is the endpoint path
+        
+        Returns:
+            List of (endpoint tuple, response or exception) in input order
+        """
+        def fetch(ep):
+            try:
+                return ep, self.session.get(f"{self.service_url}{ep[0]}")
+            except Exception as e:
+                return ep, e
+        
+        with ThreadPoolExecutor(max_workers=len(endpoints)) as ex:
+            return list(ex.map(fetch, endpoints))
     
     def wait_for_service(self) -> bool:
         """Wait for service to become available"""
@@ -50,9 +76,10 @@ class PostDeploymentVerifier:
             ('/health/detailed', 'Detailed health check')
         ]
         
-        for endpoint, description in endpoints:
+        for (endpoint, description), response in self._fetch_endpoints(endpoints):
             try:
-                response = self.session.get(f"{self.service_url}{endpoint}")
+                if isinstance(response, Exception):
+                    raise response
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -81,12 +108,10 @@ class PostDeploymentVerifier:
             ('/api/media/upload/status', 'GET', 'Upload status')
         ]
         
-        for endpoint, method, description in endpoints:
+        for (endpoint, method, description), response in self._fetch_endpoints(endpoints):
             try:
-                if method == 'GET':
-                    response = self.session.get(f"{self.service_url}{endpoint}")
-                else:
-                    response = self.session.request(method, f"{self.service_url}{endpoint}")
+                if isinstance(response, Exception):
+                    raise response
                 
                 if response.status_code in [200, 201]:
                     data = response.json()
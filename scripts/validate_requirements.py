@@ -3,83 +3,330 @@
 Requirements validation script for Media Management Service
 """
 
+import hashlib
+import json
+import os
 import subprocess
 import sys
-import pkg_resources
+import threading
+import time
 from packaging import version
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
 import requests
+from requests.adapters import HTTPAdapter
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def validate_requirements():
-    """Validate all requirements in requirements.txt"""
+PYPI_CACHE_DIR = '.pypi-cache'
+PYPI_CACHE_VERSION = 2  # bump when the shape of cached bodies changes
+USER_AGENT = 'telegive-media-validate-requirements/1.0 (+https://github.com/azatarm-prog/telegive-media)'
+
+# Stay within PyPI's published API rate limits
+PYPI_RATE_LIMIT = 5  # requests per second
+PYPI_MAX_WORKERS = 8
+PYPI_MAX_RETRIES = 3
+
+# Packages that frequently ship security fixes
+SECURITY_SENSITIVE_PACKAGES = frozenset({'pillow', 'flask', 'requests', 'sqlalchemy'})
+
+# PEP 691 JSON form of the Simple API - a compact version listing
+SIMPLE_API_ACCEPT = 'application/vnd.pypi.simple.v1+json'
+
+@lru_cache(maxsize=4096)
+def parse_version(version_string):
+    """Parse a version string, reusing previously parsed Version objects"""
+    return version.parse(version_string)
+
+def slim_simple_index(index):
+    """Keep only the version listing from a Simple API document (drops per-file entries)"""
+    return {'versions': index.get('versions')}
+
+def slim_package_info(package_info):
+    """Keep only the latest version and release names from a /pypi/<name>/json document"""
+    return {
+        'info': {'version': package_info['info']['version']},
+        'releases': {release: None for release in package_info['releases']}
+    }
+
+def latest_release(versions):
+    """Return the newest non-prerelease version string, or None"""
+    latest = None
+    for version_string in versions:
+        try:
+            parsed = parse_version(version_string)
+        except version.InvalidVersion:
+            continue
+        if not parsed.is_prerelease and (latest is None or parsed > parse_version(latest)):
+            latest = version_string
+    return latest
+
+def create_pypi_session():
+    """Create a requests session identifying this tool to PyPI"""
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
     
-    print("🔍 Validating requirements.txt...")
+    # One keep-alive connection per worker so concurrent lookups never re-handshake
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PYPI_MAX_WORKERS, pool_block=True)
+    session.mount('https://', adapter)
+    return session
+
+def fetch_pypi_json(session, url, timeout=10, limiter=None, accept=None, extract=None):
+    """
+    Fetch a PyPI JSON document, revalidating against an on-disk cache
+    
+    The cached ETag / Last-Modified values are sent as conditional headers so
+    unchanged documents come back as a small 304 instead of the full body.
+    
+    Args:
+        session: requests.Session to use
+        url: PyPI JSON URL
+        timeout: Request timeout in seconds
+        limiter: Optional RateLimiter applied before every request
+        accept: Optional Accept header (e.g. the Simple API JSON media type)
+        extract: Optional callable reducing the document to the fields needed;
+            only the reduced document is cached and returned
+    
+    Returns:
+        Parsed JSON document, or None if the package was not found
+    """
+    cache_file = os.path.join(PYPI_CACHE_DIR, hashlib.sha1(f'{PYPI_CACHE_VERSION}:{url}'.encode()).hexdigest() + '.json')
+    
+    cached = None
+    try:
+        with open(cache_file, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        pass
+    
+    headers = {'Accept': accept} if accept else {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    
+    for attempt in range(PYPI_MAX_RETRIES + 1):
+        if limiter:
+            limiter.wait()
+        
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code != 429 or attempt == PYPI_MAX_RETRIES:
+            break
+        
+        # Rate limited - honor Retry-After, otherwise back off exponentially
+        retry_after = response.headers.get('Retry-After', '')
+        time.sleep(int(retry_after) if retry_after.isdigit() else 2 ** attempt)
+    
+    if response.status_code == 304 and cached:
+        return cached['body']
+    
+    if response.status_code != 200:
+        return None
+    
+    body = _json_loads(response.content)
+    if extract:
+        # Release the full document right away; keep only what callers read
+        body = extract(body)
+    
+    try:
+        os.makedirs(PYPI_CACHE_DIR, exist_ok=True)
+        with open(cache_file, 'w') as f:
+            json.dump({
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'body': body
+            }, f)
+    except OSError as e:
+        logger.debug(f"Could not write PyPI cache for {url}: {e}")
+    
+    return body
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls at least 1/rate seconds apart"""
+    
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second
+        self.lock = threading.Lock()
+        self.next_allowed = time.monotonic()
+    
+    def wait(self):
+        """Block until the next call slot is available"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_allowed - now
+            self.next_allowed = max(now, self.next_allowed) + self.interval
+        
+        if delay > 0:
+            time.sleep(delay)
+
+def load_requirements(path='requirements.txt'):
+    """
+    Parse a requirements file once into Requirement objects
+    
+    Args:
+        path: Path to the requirements file
     
+    Returns:
+        List of packaging Requirement objects, or None if the file is
+        missing or contains an unparseable line
+    """
     try:
-        with open('requirements.txt', 'r') as f:
-            requirements = f.read().strip().split('\n')
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
     except FileNotFoundError:
-        print("❌ requirements.txt not found")
-        return False
+        print(f"❌ {path} not found")
+        return None
     
-    invalid_packages = []
-    outdated_packages = []
-    security_issues = []
+    requirements = []
+    for line in lines:
+        # Drop inline comments; skip pip options such as -r / --index-url
+        line = line.split(' #', 1)[0].strip()
+        if not line or line.startswith(('#', '-')):
+            continue
+        
+        try:
+            requirements.append(Requirement(line))
+        except InvalidRequirement as e:
+            print(f"❌ Invalid requirement line '{line}': {e}")
+            return None
     
-    for req in requirements:
-        if not req.strip() or req.startswith('#'):
+    return requirements
+
+def pinned_version(requirement):
+    """Return the exact version pinned with == / ===, or None if not pinned"""
+    return next(
+        (spec.version for spec in requirement.specifier
+         if spec.operator in ('==', '===') and '*' not in spec.version),
+        None
+    )
+
+def parsed_versions(version_strings):
+    """Yield parsed versions, skipping legacy strings packaging cannot parse"""
+    for version_string in version_strings:
+        try:
+            yield parse_version(version_string)
+        except version.InvalidVersion:
             continue
-            
-        # Parse package name and version
-        if '==' in req:
-            package_name, package_version = req.split('==')
-        else:
-            package_name = req
-            package_version = None
+
+def check_package(session, limiter, requirement):
+    """
+    Validate a single requirement line against PyPI
+    
+    Args:
+        session: Shared requests.Session
+        limiter: RateLimiter shared across worker threads
+        requirement: Parsed Requirement, e.g. Requirement("Flask==2.3.3")
+    
+    Returns:
+        dict with 'invalid', 'outdated', 'security' and 'warnings' lists
+    """
+    result = {'invalid': [], 'outdated': [], 'security': [], 'warnings': []}
+    
+    package_name = canonicalize_name(requirement.name)
+    package_version = pinned_version(requirement)
+    
+    # Check if package exists on PyPI
+    try:
+        index = fetch_pypi_json(
+            session, f'https://pypi.org/simple/{package_name}/',
+            limiter=limiter, accept=SIMPLE_API_ACCEPT, extract=slim_simple_index
+        )
+        if index is None:
+            result['invalid'].append(package_name)
+            return result
         
-        package_name = package_name.strip()
+        available_versions = index.get('versions')
+        latest_version = latest_release(available_versions) if available_versions else None
         
-        # Check if package exists on PyPI
-        try:
-            response = requests.get(f'https://pypi.org/pypi/{package_name}/json', timeout=10)
-            if response.status_code != 200:
-                invalid_packages.append(package_name)
-                continue
-                
-            package_info = response.json()
+        if latest_version is None:
+            # Index without a versions listing - fall back to the full JSON API
+            package_info = fetch_pypi_json(
+                session, f'https://pypi.org/pypi/{package_name}/json',
+                limiter=limiter, extract=slim_package_info
+            )
+            if package_info is None:
+                result['invalid'].append(package_name)
+                return result
+            
+            available_versions = list(package_info['releases'].keys())
             latest_version = package_info['info']['version']
+        
+        if package_version:
+            # Check if specified version exists
+            if package_version not in set(available_versions):
+                result['invalid'].append(f"{package_name}=={package_version}")
+                return result
             
-            if package_version:
-                # Check if specified version exists
-                available_versions = list(package_info['releases'].keys())
-                if package_version not in available_versions:
-                    invalid_packages.append(f"{package_name}=={package_version}")
-                    continue
+            # Compare once; major, minor and security checks all reuse the result
+            try:
+                current = parse_version(package_version)
+                latest = parse_version(latest_version)
+                behind = current < latest
                 
-                # Check if version is outdated (major version behind)
-                try:
-                    current_major = version.parse(package_version).major
-                    latest_major = version.parse(latest_version).major
-                    
-                    if current_major < latest_major:
-                        outdated_packages.append(f"{package_name}: {package_version} -> {latest_version} (major version behind)")
-                    elif version.parse(package_version) < version.parse(latest_version):
-                        # Minor version behind - just a warning
-                        print(f"⚠️  {package_name}: {package_version} -> {latest_version} (minor update available)")
-                except:
-                    pass
-            
-            # Check for known security vulnerabilities (simplified check)
-            if package_name.lower() in ['pillow', 'flask', 'requests', 'sqlalchemy']:
+                if current.major < latest.major:
+                    result['outdated'].append(f"{package_name}: {package_version} -> {latest_version} (major version behind)")
+                elif behind:
+                    # Minor version behind - just a warning
+                    result['warnings'].append(f"⚠️  {package_name}: {package_version} -> {latest_version} (minor update available)")
+                
+                # Check for known security vulnerabilities (simplified check)
                 # These packages often have security updates
-                if package_version and version.parse(package_version) < version.parse(latest_version):
-                    security_issues.append(f"{package_name}: Consider updating from {package_version} to {latest_version} for security")
+                if behind and package_name.lower() in SECURITY_SENSITIVE_PACKAGES:
+                    result['security'].append(f"{package_name}: Consider updating from {package_version} to {latest_version} for security")
+            except:
+                pass
+        elif requirement.specifier:
+            # Range specifier (~=, >=, !=, ...) - at least one release must satisfy it
+            if not any(requirement.specifier.filter(parsed_versions(available_versions))):
+                result['invalid'].append(f"{package_name}{requirement.specifier}")
+                return result
             
-        except Exception as e:
-            print(f"⚠️  Could not validate {package_name}: {e}")
+            if not requirement.specifier.contains(latest_version):
+                result['warnings'].append(f"⚠️  {package_name}: latest {latest_version} is excluded by '{requirement.specifier}'")
+        
+    except Exception as e:
+        result['warnings'].append(f"⚠️  Could not validate {package_name}: {e}")
+    
+    return result
+
+def validate_requirements(requirements):
+    """
+    Validate all requirements against PyPI
+    
+    Args:
+        requirements: Requirement objects from load_requirements()
+    """
+    
+    print("🔍 Validating requirements.txt...")
+    
+    invalid_packages = []
+    outdated_packages = []
+    security_issues = []
+    
+    session = create_pypi_session()
+    limiter = RateLimiter(PYPI_RATE_LIMIT)
+    
+    # Network-bound: fetch concurrently, report in requirements.txt order
+    with ThreadPoolExecutor(max_workers=PYPI_MAX_WORKERS) as executor:
+        results = list(executor.map(lambda req: check_package(session, limiter, req), requirements))
+    
+    for result in results:
+        for warning in result['warnings']:
+            print(warning)
+        invalid_packages.extend(result['invalid'])
+        outdated_packages.extend(result['outdated'])
+        security_issues.extend(result['security'])
     
     # Report results
     success = True
@@ -111,29 +358,13 @@ def check_requirements_installability():
     print("🔧 Testing requirements installation...")
     
     try:
-        # Create a temporary virtual environment and test installation
-        result = subprocess.run([
-            sys.executable, '-m', 'venv', 'temp_test_env'
-        ], capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            print("❌ Failed to create test virtual environment")
-            return False
-        
-        # Activate and install requirements
-        if sys.platform == "win32":
-            pip_path = "temp_test_env\\Scripts\\pip"
-        else:
-            pip_path = "temp_test_env/bin/pip"
-        
+        # Resolve the full dependency graph without unpacking any wheels
         result = subprocess.run([
-            pip_path, 'install', '-r', 'requirements.txt'
+            sys.executable, '-m', 'pip', 'install',
+            '--dry-run', '--ignore-installed', '--quiet',
+            '-r', 'requirements.txt'
         ], capture_output=True, text=True)
         
-        # Cleanup
-        import shutil
-        shutil.rmtree('temp_test_env', ignore_errors=True)
-        
         if result.returncode != 0:
             print("❌ Requirements installation failed:")
             print(result.stderr)
@@ -146,8 +377,13 @@ def check_requirements_installability():
         print(f"❌ Requirements installation test failed: {e}")
         return False
 
-def check_critical_packages():
-    """Check critical packages for Media Management Service"""
+def check_critical_packages(requirements):
+    """
+    Check critical packages for Media Management Service
+    
+    Args:
+        requirements: Requirement objects from load_requirements()
+    """
     print("🔍 Checking critical packages...")
     
     critical_packages = {
@@ -161,18 +397,13 @@ def check_critical_packages():
         'pytest': 'Testing framework'
     }
     
-    try:
-        with open('requirements.txt', 'r') as f:
-            requirements_content = f.read()
-    except FileNotFoundError:
-        print("❌ requirements.txt not found")
-        return False
-    
-    missing_critical = []
+    required_names = {canonicalize_name(requirement.name) for requirement in requirements}
     
-    for package, description in critical_packages.items():
-        if package.lower() not in requirements_content.lower():
-            missing_critical.append(f"{package} ({description})")
+    missing_critical = [
+        f"{package} ({description})"
+        for package, description in critical_packages.items()
+        if canonicalize_name(package) not in required_names
+    ]
     
     if missing_critical:
         print("❌ Missing critical packages:")
@@ -187,14 +418,20 @@ def main():
     """Main validation process"""
     print("🚀 Starting requirements validation for Media Management Service")
     
+    # Parse requirements.txt once and share it across checks
+    requirements = load_requirements()
+    if requirements is None:
+        print("\n❌ Requirements validation failed!")
+        return 1
+    
     success = True
     
     # Check critical packages
-    if not check_critical_packages():
+    if not check_critical_packages(requirements):
         success = False
     
     # Validate requirements
-    if not validate_requirements():
+    if not validate_requirements(requirements):
         success = False
     
     # Test installation
@@ -10,7 +10,13 @@ __all__ = [
 ]
 
 def init_services(app):
-    """Initialize all services with Flask app"""
+    """Initialize the service instances with Flask app (idempotent per app)"""
+    if 'auth_service' in app.extensions:
+        return
+    
     auth_service.init_app(app)
-    telegive_service.init_app(app)
-
+    app.extensions['auth_service'] = auth_service
+    
+    # Reuse the auth service initialized above rather than initializing it again
+    telegive_service.init_app(app, auth_service=auth_service)
+    app.extensions['telegive_service'] = telegive_service
@@ -1,8 +1,143 @@
+import hashlib
+import hmac
+import json
 import jwt
 import requests
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
+from types import MappingProxyType
+from jwt.algorithms import HMACAlgorithm
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import request, jsonify, current_app
-from datetime import datetime, timedelta
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and a hard size bound"""
+    
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            
+            value, deadline = entry
+            if deadline <= time.monotonic():
+                del self._data[key]
+                return None
+            
+            self._data.move_to_end(key)
+            return value
+    
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            
+            # Evict least recently used entries beyond the bound
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key):
+        """Remove a key if present"""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+
+class TemplatedHMACAlgorithm(HMACAlgorithm):
+    """
+    HMAC JWT algorithm that keys the HMAC once per secret
+    
+    Each signature is computed from a copy of a pre-keyed HMAC object,
+    skipping the per-call key padding/inner-outer hash setup.
+    """
+    
+    def __init__(self, hash_alg):
+        super().__init__(hash_alg)
+        self._templates = {}
+    
+    def sign(self, msg, key):
+        template = self._templates.get(key)
+        if template is None:
+            template = hmac.new(key, digestmod=self.hash_alg)
+            # Service secrets are few; avoid growing on arbitrary keys
+            if len(self._templates) < 8:
+                self._templates[key] = template
+        
+        mac = template.copy()
+        mac.update(msg)
+        return mac.digest()
+
+def _static_error(error, error_code, status):
+    """Pre-serialize a fixed auth error body once at import time"""
+    body = json.dumps(
+        {'success': False, 'error': error, 'error_code': error_code},
+        separators=(',', ':'),
+        sort_keys=True
+    ).encode() + b'\n'
+    return body, status
+
+_ERR_MISSING_AUTH = _static_error('Authorization header required', 'MISSING_AUTH_HEADER', 401)
+_ERR_INVALID_AUTH_TYPE = _static_error('Bearer token required', 'INVALID_AUTH_TYPE', 401)
+_ERR_INVALID_AUTH_FORMAT = _static_error('Invalid authorization header format', 'INVALID_AUTH_FORMAT', 401)
+_ERR_INSUFFICIENT_PERMISSIONS = _static_error('Insufficient permissions', 'INSUFFICIENT_PERMISSIONS', 403)
+_ERR_MISSING_SERVICE = _static_error('Service name header required', 'MISSING_SERVICE_HEADER', 401)
+
+def _error_response(error):
+    """Build a JSON response from a pre-serialized (body, status) pair"""
+    body, status = error
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+def _identity(validation_result):
+    """
+    (user_id, account_id, permissions) for require_auth
+    
+    Permissions become a set once per token so every cached hit is a
+    set-vs-set check.
+    """
+    return (
+        validation_result['user_id'],
+        validation_result['account_id'],
+        frozenset(validation_result.get('permissions') or ())
+    )
+
+def _parse_bearer_token(auth_header):
+    """
+    Extract the token from a Bearer Authorization header
+    
+    Returns:
+        tuple: (token, None) on success, (None, error) otherwise
+    """
+    if not auth_header:
+        return None, _ERR_MISSING_AUTH
+    
+    if auth_header[:7].lower() == 'bearer ':
+        return auth_header[7:], None
+    
+    if ' ' in auth_header:
+        return None, _ERR_INVALID_AUTH_TYPE
+    
+    return None, _ERR_INVALID_AUTH_FORMAT
 
 class AuthService:
     """Authentication service integration"""
@@ -10,13 +145,38 @@ class AuthService:
     def __init__(self):
         self.auth_url = None
         self.secret_key = None
-        self.token_cache = {}  # Simple in-memory cache for tokens
         self.cache_ttl = 300  # 5 minutes
+        self.cache_maxsize = 10000
+        # (validation result, identity tuple) per token cache key
+        self.token_cache = TTLCache(maxsize=self.cache_maxsize, ttl=self.cache_ttl)
+        self._cache_hmac_key = b''
+        self._session = None
+        self._secret_bytes = None
+        
+        # Own JWS instance with the templated HS256 (same output, cheaper per
+        # call); registering it globally would change HS256 for every PyJWT
+        # user in the process
+        self._jws = jwt.PyJWS(algorithms=[])
+        self._jws.register_algorithm('HS256', TemplatedHMACAlgorithm(HMACAlgorithm.SHA256))
     
     def init_app(self, app):
         """Initialize with Flask app"""
         self.auth_url = app.config.get('TELEGIVE_AUTH_URL')
         self.secret_key = app.config.get('SECRET_KEY')
+        self._secret_bytes = self.secret_key.encode() if self.secret_key else None
+        
+        # BLAKE2b keys are capped at 64 bytes - derive a fixed-size key from the secret
+        self._cache_hmac_key = hashlib.sha256((self.secret_key or '').encode()).digest()
+        
+        # Keep-alive connection pool for auth service calls
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=64,
+            max_retries=Retry(total=2, backoff_factor=0.1)
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
     
     def validate_service_token(self, token):
         """
@@ -37,18 +197,7 @@ class AuthService:
         
         try:
             # Decode JWT token
-            payload = jwt.decode(
-                token, 
-                self.secret_key, 
-                algorithms=['HS256']
-            )
-            
-            # Check token expiration
-            if 'exp' in payload:
-                exp_time = datetime.fromtimestamp(payload['exp'])
-                if exp_time < datetime.utcnow():
-                    result['error'] = 'Token expired'
-                    return result
+            payload = self._decode_token(token)
             
             # Extract service information
             result.update({
@@ -68,12 +217,51 @@ class AuthService:
         
         return result
     
-    def validate_user_token(self, token):
+    def _decode_token(self, token):
+        """
+        Verify an HS256 token with the templated signer and check its claims
+        
+        Args:
+            token: JWT token string
+        
+        Returns:
+            dict: Token payload
+        
+        Raises:
+            jwt.InvalidTokenError: Bad signature, payload or claims
+        """
+        decoded = self._jws.decode_complete(token, self._secret_bytes, algorithms=['HS256'])
+        
+        try:
+            payload = _json_loads(decoded['payload'])
+        except ValueError as e:
+            raise jwt.DecodeError(f'Invalid payload string: {e}')
+        
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError('Invalid payload string: must be a json object')
+        
+        for claim in ('exp', 'iat'):
+            if claim not in payload:
+                raise jwt.MissingRequiredClaimError(claim)
+            if not isinstance(payload[claim], (int, float)) or isinstance(payload[claim], bool):
+                raise jwt.DecodeError(f'The {claim} claim must be a number')
+        
+        if payload['exp'] <= time.time():
+            raise jwt.ExpiredSignatureError('Signature has expired')
+        
+        return payload
+    
+    def _cache_key(self, token):
+        """Keyed hash of the full token - JWT prefixes are shared between users"""
+        return hashlib.blake2b(token.encode(), digest_size=16, key=self._cache_hmac_key).digest()
+    
+    def validate_user_token(self, token, cache_key=None):
         """
         Validate user authentication token with auth service
         
         Args:
             token: Authentication token
+            cache_key: The token's _cache_key(), if the caller already has it
         
         Returns:
             dict: Validation result with user info
@@ -87,11 +275,11 @@ class AuthService:
         }
         
         # Check cache first
-        cache_key = f"token:{token[:16]}"  # Use first 16 chars as cache key
-        if cache_key in self.token_cache:
-            cached_result, cached_time = self.token_cache[cache_key]
-            if datetime.utcnow() - cached_time < timedelta(seconds=self.cache_ttl):
-                return cached_result
+        if cache_key is None:
+            cache_key = self._cache_key(token)
+        cached = self.token_cache.get(cache_key)
+        if cached is not None:
+            return cached[0]
         
         try:
             if not self.auth_url:
@@ -99,15 +287,14 @@ class AuthService:
                 return result
             
             # Call auth service to validate token
-            response = requests.post(
+            response = self._session.post(
                 f"{self.auth_url}/api/auth/validate",
                 json={'token': token},
-                headers={'Content-Type': 'application/json'},
                 timeout=10
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = _json_loads(response.content)
                 if data.get('valid'):
                     result.update({
                         'valid': True,
@@ -116,8 +303,10 @@ class AuthService:
                         'permissions': data.get('permissions', [])
                     })
                     
-                    # Cache successful result
-                    self.token_cache[cache_key] = (result.copy(), datetime.utcnow())
+                    # Cache successful result; read-only view so callers can't mutate the shared entry.
+                    # The identity tuple rides along so require_auth hits need no rebuilding
+                    result = MappingProxyType(result)
+                    self.token_cache[cache_key] = (result, _identity(result))
                 else:
                     result['error'] = data.get('error', 'Token validation failed')
             else:
@@ -147,14 +336,19 @@ class AuthService:
         if permissions is None:
             permissions = []
         
+        now = int(time.time())
         payload = {
             'service_name': service_name,
             'permissions': permissions,
-            'iat': datetime.utcnow(),
-            'exp': datetime.utcnow() + timedelta(seconds=expires_in)
+            'iat': now,
+            'exp': now + expires_in
         }
         
-        return jwt.encode(payload, self.secret_key, algorithm='HS256')
+        return self._jws.encode(
+            json.dumps(payload, separators=(',', ':')).encode(),
+            self._secret_bytes,
+            algorithm='HS256'
+        )
     
     def require_auth(self, permissions=None):
         """
@@ -166,59 +360,42 @@ class AuthService:
         Returns:
             Decorator function
         """
-        if permissions is None:
-            permissions = []
+        required_permissions = frozenset(permissions or ())
         
         def decorator(f):
             @wraps(f)
             def decorated_function(*args, **kwargs):
                 # Get token from Authorization header
-                auth_header = request.headers.get('Authorization')
-                if not auth_header:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Authorization header required',
-                        'error_code': 'MISSING_AUTH_HEADER'
-                    }), 401
+                token, error = _parse_bearer_token(request.headers.get('Authorization'))
+                if error:
+                    return _error_response(error)
                 
-                # Extract token
-                try:
-                    token_type, token = auth_header.split(' ', 1)
-                    if token_type.lower() != 'bearer':
+                # Repeat requests with the same token skip validation entirely
+                cache_key = self._cache_key(token)
+                cached = self.token_cache.get(cache_key)
+                if cached is not None:
+                    identity = cached[1]
+                else:
+                    validation_result = self.validate_user_token(token, cache_key=cache_key)
+                    
+                    if not validation_result['valid']:
                         return jsonify({
                             'success': False,
-                            'error': 'Bearer token required',
-                            'error_code': 'INVALID_AUTH_TYPE'
+                            'error': validation_result['error'],
+                            'error_code': 'AUTH_FAILED'
                         }), 401
-                except ValueError:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Invalid authorization header format',
-                        'error_code': 'INVALID_AUTH_FORMAT'
-                    }), 401
-                
-                # Validate token
-                validation_result = self.validate_user_token(token)
+                    
+                    identity = _identity(validation_result)
                 
-                if not validation_result['valid']:
-                    return jsonify({
-                        'success': False,
-                        'error': validation_result['error'],
-                        'error_code': 'AUTH_FAILED'
-                    }), 401
+                user_id, account_id, user_permissions = identity
                 
                 # Check permissions
-                user_permissions = validation_result.get('permissions', [])
-                if permissions and not any(perm in user_permissions for perm in permissions):
-                    return jsonify({
-                        'success': False,
-                        'error': 'Insufficient permissions',
-                        'error_code': 'INSUFFICIENT_PERMISSIONS'
-                    }), 403
+                if required_permissions and required_permissions.isdisjoint(user_permissions):
+                    return _error_response(_ERR_INSUFFICIENT_PERMISSIONS)
                 
                 # Add user info to request context
-                request.user_id = validation_result['user_id']
-                request.account_id = validation_result['account_id']
+                request.user_id = user_id
+                request.account_id = account_id
                 request.user_permissions = user_permissions
                 
                 return f(*args, **kwargs)
@@ -245,36 +422,12 @@ class AuthService:
                 # Get service name from header
                 service_name = request.headers.get('X-Service-Name')
                 if not service_name:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Service name header required',
-                        'error_code': 'MISSING_SERVICE_HEADER'
-                    }), 401
+                    return _error_response(_ERR_MISSING_SERVICE)
                 
                 # Get token from Authorization header
-                auth_header = request.headers.get('Authorization')
-                if not auth_header:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Authorization header required',
-                        'error_code': 'MISSING_AUTH_HEADER'
-                    }), 401
-                
-                # Extract token
-                try:
-                    token_type, token = auth_header.split(' ', 1)
-                    if token_type.lower() != 'bearer':
-                        return jsonify({
-                            'success': False,
-                            'error': 'Bearer token required',
-                            'error_code': 'INVALID_AUTH_TYPE'
-                        }), 401
-                except ValueError:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Invalid authorization header format',
-                        'error_code': 'INVALID_AUTH_FORMAT'
-                    }), 401
+                token, error = _parse_bearer_token(request.headers.get('Authorization'))
+                if error:
+                    return _error_response(error)
                 
                 # Validate service token
                 validation_result = self.validate_service_token(token)
@@ -311,7 +464,8 @@ class AuthService:
         """Get cache statistics"""
         return {
             'cached_tokens': len(self.token_cache),
-            'cache_ttl': self.cache_ttl
+            'cache_ttl': self.cache_ttl,
+            'cache_maxsize': self.cache_maxsize
         }
 
 # Global auth service instance
@@ -1,7 +1,71 @@
+import atexit
+import hashlib
+import jwt
 import requests
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import current_app
 from datetime import datetime
 
+from .auth_service import TTLCache
+from .webhook_dispatcher import WebhookDispatcher
+
+try:
+    import httpx
+except ImportError:  # Optional: only needed when TELEGIVE_HTTP2 is enabled
+    httpx = None
+
+class CircuitOpenError(Exception):
+    """Raised when calls are short-circuited by an open circuit breaker"""
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, retrying after a cooldown"""
+    
+    def __init__(self, fail_max=5, reset_timeout=30):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    def before_call(self):
+        """Raise CircuitOpenError while open; allow one trial call after the cooldown"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError()
+            # Half-open: only this call goes through until it reports back
+            self._trial_in_flight = True
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            # A failed trial re-opens for another full cooldown
+            if self._trial_in_flight or self._failures >= self.fail_max:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+    
+    def release(self):
+        """End a call without counting it, letting the next caller make the trial"""
+        with self._lock:
+            self._trial_in_flight = False
+    
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        return 'half_open' if self._trial_in_flight else 'open'
+
 class TelegiveService:
     """Integration with main Telegive giveaway service"""
     
@@ -9,132 +73,318 @@ class TelegiveService:
         self.service_url = None
         self.service_token = None
         self.timeout = 30
+        self.webhook_timeout = 5  # Webhooks are fire-and-observe; don't hold workers for 30s
+        self.auth_service = None
+        self._app = None
+        self._token_expires_at = None
+        self._refresh_timer = None
+        self._breaker = CircuitBreaker(fail_max=5, reset_timeout=30)
+        self._giveaway_cache = TTLCache(maxsize=1024, ttl=60)
+        self._access_cache = TTLCache(maxsize=1024, ttl=30)
+        self._dispatcher = WebhookDispatcher(
+            send_one=self._send_webhook,
+            send_batch=self._send_webhook_batch
+        )
+        
+        # Keep-alive connection pool shared by all giveaway service calls
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=self._build_retry())
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers['X-Service-Name'] = 'media-service'
+        self._http2_client = None
+        atexit.register(self.close)
     
-    def init_app(self, app):
-        """Initialize with Flask app"""
+    @staticmethod
+    def _build_retry():
+        """Exponential backoff with jitter for transient giveaway service failures"""
+        retry_kwargs = {
+            'total': 3,
+            'backoff_factor': 1.0,
+            'status_forcelist': (429, 500, 502, 503, 504),
+            'allowed_methods': frozenset(['GET', 'POST']),
+            'respect_retry_after_header': True,
+            'raise_on_status': False
+        }
+        
+        try:
+            return Retry(backoff_jitter=0.5, backoff_max=30, **retry_kwargs)
+        except TypeError:
+            # urllib3 < 2 has no jitter support
+            return Retry(**retry_kwargs)
+    
+    def init_app(self, app, auth_service=None):
+        """
+        Initialize with Flask app
+        
+        Args:
+            app: Flask application
+            auth_service: Already initialized AuthService to sign tokens with;
+                defaults to the module-level instance
+        """
         self.service_url = app.config.get('TELEGIVE_GIVEAWAY_URL')
+        self._app = app
+        
+        if app.config.get('TELEGIVE_HTTP2', False):
+            self._init_http2_client(app)
+        
+        if auth_service is None:
+            from services.auth_service import auth_service
+            auth_service.init_app(app)
+        self.auth_service = auth_service
         
         # Generate service token for authentication
-        from services.auth_service import auth_service
-        auth_service.init_app(app)
         self.service_token = auth_service.generate_service_token(
             'media-service',
             permissions=['media_management', 'file_cleanup']
         )
+        self._apply_service_token()
     
-    def notify_file_uploaded(self, file_id, account_id, file_info):
+    def _init_http2_client(self, app):
+        """Multiplex giveaway service calls over one HTTP/2 connection when httpx is installed"""
+        if httpx is None:
+            app.logger.warning('TELEGIVE_HTTP2 enabled but httpx is not installed, using HTTP/1.1')
+            return
+        
+        try:
+            limits = httpx.Limits(max_keepalive_connections=10, max_connections=20)
+            self._http2_client = httpx.Client(
+                transport=httpx.HTTPTransport(http2=True, limits=limits, retries=3),
+                timeout=httpx.Timeout(self.timeout, connect=2),
+                headers={'X-Service-Name': self._session.headers['X-Service-Name']}
+            )
+        except ImportError:
+            # http2=True needs the h2 package (httpx[http2])
+            app.logger.warning('TELEGIVE_HTTP2 enabled but h2 is not installed, using HTTP/1.1')
+    
+    def _apply_service_token(self):
+        """Install a freshly generated token and schedule its proactive refresh"""
+        self._session.headers['Authorization'] = f'Bearer {self.service_token}'
+        if self._http2_client is not None:
+            self._http2_client.headers['Authorization'] = f'Bearer {self.service_token}'
+        
+        # Signature was just produced locally; only the exp claim is needed
+        claims = jwt.decode(self.service_token, options={'verify_signature': False})
+        self._token_expires_at = claims.get('exp')
+        
+        if self._refresh_timer:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+        
+        if self._token_expires_at:
+            # Refresh 60s before expiry so no request goes out with a stale token
+            delay = max(self._token_expires_at - time.time() - 60, 0)
+            self._refresh_timer = threading.Timer(delay, self._scheduled_token_refresh)
+            self._refresh_timer.daemon = True
+            self._refresh_timer.start()
+    
+    def _scheduled_token_refresh(self):
+        """Timer callback: refresh the service token inside the app context"""
+        if self._app is None:
+            return
+        with self._app.app_context():
+            self.refresh_service_token()
+    
+    def close(self):
+        """Close pooled connections to the giveaway service"""
+        if self._refresh_timer:
+            self._refresh_timer.cancel()
+        self._session.close()
+        if self._http2_client is not None:
+            self._http2_client.close()
+    
+    def _send(self, method, url, **kwargs):
         """
-        Notify giveaway service about file upload
+        Send a request over the HTTP/2 client if enabled, otherwise the pooled session
+        
+        httpx errors are re-raised as their requests equivalents so callers
+        handle a single set of exceptions.
+        """
+        if self._http2_client is None:
+            return self._session.request(method, url, **kwargs)
+        
+        try:
+            return self._http2_client.request(method, url, **kwargs)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+    
+    def _request(self, method, path, *, json=None, params=None, headers=None, timeout=None, use_breaker=True):
+        """
+        Issue a request to the giveaway service
+        
+        All calls share the URL check, circuit breaker, token refresh and
+        error mapping done here.
         
         Args:
-            file_id: Media file ID
-            account_id: Account ID
-            file_info: File information dict
+            method: HTTP method
+            path: Endpoint path, appended to the service URL
+            json: Optional JSON body
+            params: Optional query parameters
+            headers: Optional per-request headers
+            timeout: Request timeout, defaults to self.timeout
+            use_breaker: Route the call through the circuit breaker
         
         Returns:
-            dict: Notification result
+            tuple: (response, None) on success, (None, error message) otherwise
         """
-        result = {
-            'success': False,
-            'error': None
+        if not self.service_url:
+            return None, 'Giveaway service URL not configured'
+        
+        if use_breaker:
+            try:
+                self._breaker.before_call()
+            except CircuitOpenError:
+                return None, 'Giveaway service circuit open'
+        
+        url = f"{self.service_url}{path}"
+        kwargs = {
+            'json': json,
+            'params': params,
+            'headers': headers,
+            'timeout': timeout or self.timeout
         }
         
         try:
-            if not self.service_url:
-                result['error'] = 'Giveaway service URL not configured'
-                return result
-            
-            payload = {
-                'event': 'file_uploaded',
-                'data': {
-                    'file_id': file_id,
-                    'account_id': account_id,
-                    'file_info': file_info,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-            }
+            response = self._send(method, url, **kwargs)
             
-            response = requests.post(
-                f"{self.service_url}/api/webhooks/media",
-                json=payload,
-                headers={
-                    'Authorization': f'Bearer {self.service_token}',
-                    'Content-Type': 'application/json',
-                    'X-Service-Name': 'media-service'
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code in [200, 201]:
-                result['success'] = True
-            else:
-                result['error'] = f'Notification failed: {response.status_code}'
-                
+            # Token rejected - refresh once and retry with the new one
+            if response.status_code == 401 and self.refresh_service_token():
+                response = self._send(method, url, **kwargs)
         except requests.exceptions.Timeout:
-            result['error'] = 'Giveaway service timeout'
+            if use_breaker:
+                self._breaker.record_failure()
+            return None, 'Giveaway service timeout'
         except requests.exceptions.ConnectionError:
-            result['error'] = 'Giveaway service unavailable'
+            if use_breaker:
+                self._breaker.record_failure()
+            return None, 'Giveaway service unavailable'
         except Exception as e:
-            result['error'] = f'Notification error: {str(e)}'
+            if use_breaker:
+                self._breaker.release()
+            return None, f'Giveaway service request error: {str(e)}'
         
-        return result
+        if use_breaker:
+            if response.status_code >= 500:
+                self._breaker.record_failure()
+            else:
+                self._breaker.record_success()
+        
+        return response, None
     
-    def notify_file_deleted(self, file_id, account_id, deletion_info):
+    def _post_webhook(self, path, body, idempotency_key):
         """
-        Notify giveaway service about file deletion
+        POST to a giveaway service webhook endpoint
+        
+        Args:
+            path: Endpoint path
+            body: JSON body
+            idempotency_key: Lets the receiver deduplicate retried deliveries
+        
+        Returns:
+            dict: Notification result, including the HTTP status code
+        """
+        response, error = self._request(
+            'POST',
+            path,
+            json=body,
+            headers={'Idempotency-Key': idempotency_key},
+            timeout=self.webhook_timeout
+        )
+        
+        if error:
+            return {'success': False, 'status_code': None, 'error': error}
+        
+        if response.status_code in [200, 201]:
+            return {'success': True, 'status_code': response.status_code, 'error': None}
+        
+        return {
+            'success': False,
+            'status_code': response.status_code,
+            'error': f'Notification failed: {response.status_code}'
+        }
+    
+    def _send_webhook(self, payload, event_key):
+        """Deliver a single media event"""
+        return self._post_webhook('/api/webhooks/media', payload, event_key)
+    
+    def _send_webhook_batch(self, events):
+        """Deliver several media events in one request"""
+        keys = ','.join(event_key for _, event_key in events)
+        return self._post_webhook(
+            '/api/webhooks/media/batch',
+            {'events': [payload for payload, _ in events]},
+            f"batch-{hashlib.sha1(keys.encode()).hexdigest()}"
+        )
+    
+    def _dispatch_webhook(self, payload, event_key, background):
+        """Send a webhook inline, or queue it for the background dispatcher"""
+        if not self.service_url:
+            return {
+                'success': False,
+                'error': 'Giveaway service URL not configured'
+            }
+        
+        if not background:
+            return self._send_webhook(payload, event_key)
+        
+        queued = self._dispatcher.submit(payload, event_key)
+        return {
+            'success': queued,
+            'queued': queued,
+            'error': None if queued else 'Webhook queue full'
+        }
+    
+    def notify_file_uploaded(self, file_id, account_id, file_info, background=True):
+        """
+        Notify giveaway service about file upload
         
         Args:
             file_id: Media file ID
             account_id: Account ID
-            deletion_info: Deletion information dict
+            file_info: File information dict
+            background: Queue delivery instead of blocking on the request
         
         Returns:
             dict: Notification result
         """
-        result = {
-            'success': False,
-            'error': None
+        payload = {
+            'event': 'file_uploaded',
+            'data': {
+                'file_id': file_id,
+                'account_id': account_id,
+                'file_info': file_info,
+                'timestamp': datetime.utcnow().isoformat()
+            }
         }
         
-        try:
-            if not self.service_url:
-                result['error'] = 'Giveaway service URL not configured'
-                return result
-            
-            payload = {
-                'event': 'file_deleted',
-                'data': {
-                    'file_id': file_id,
-                    'account_id': account_id,
-                    'deletion_info': deletion_info,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
+        return self._dispatch_webhook(payload, f'file-upload-{file_id}', background)
+    
+    def notify_file_deleted(self, file_id, account_id, deletion_info, background=True):
+        """
+        Notify giveaway service about file deletion
+        
+        Args:
+            file_id: Media file ID
+            account_id: Account ID
+            deletion_info: Deletion information dict
+            background: Queue delivery instead of blocking on the request
+        
+        Returns:
+            dict: Notification result
+        """
+        payload = {
+            'event': 'file_deleted',
+            'data': {
+                'file_id': file_id,
+                'account_id': account_id,
+                'deletion_info': deletion_info,
+                'timestamp': datetime.utcnow().isoformat()
             }
-            
-            response = requests.post(
-                f"{self.service_url}/api/webhooks/media",
-                json=payload,
-                headers={
-                    'Authorization': f'Bearer {self.service_token}',
-                    'Content-Type': 'application/json',
-                    'X-Service-Name': 'media-service'
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code in [200, 201]:
-                result['success'] = True
-            else:
-                result['error'] = f'Notification failed: {response.status_code}'
-                
-        except requests.exceptions.Timeout:
-            result['error'] = 'Giveaway service timeout'
-        except requests.exceptions.ConnectionError:
-            result['error'] = 'Giveaway service unavailable'
-        except Exception as e:
-            result['error'] = f'Notification error: {str(e)}'
+        }
         
-        return result
+        return self._dispatch_webhook(payload, f'file-delete-{file_id}', background)
     
     def get_giveaway_info(self, giveaway_id):
         """
@@ -146,45 +396,34 @@ class TelegiveService:
         Returns:
             dict: Giveaway information or error
         """
-        result = {
-            'success': False,
-            'giveaway_info': None,
-            'error': None
-        }
+        cached = self._giveaway_cache.get(giveaway_id)
+        if cached is not None:
+            return dict(cached)
         
-        try:
-            if not self.service_url:
-                result['error'] = 'Giveaway service URL not configured'
-                return result
-            
-            response = requests.get(
-                f"{self.service_url}/api/giveaways/{giveaway_id}",
-                headers={
-                    'Authorization': f'Bearer {self.service_token}',
-                    'X-Service-Name': 'media-service'
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
+        response, error = self._request('GET', f'/api/giveaways/{giveaway_id}')
+        
+        if error:
+            return {'success': False, 'giveaway_info': None, 'error': error}
+        
+        if response.status_code == 200:
+            try:
                 data = response.json()
-                result.update({
-                    'success': True,
-                    'giveaway_info': data.get('giveaway_info')
-                })
-            elif response.status_code == 404:
-                result['error'] = 'Giveaway not found'
-            else:
-                result['error'] = f'Failed to get giveaway info: {response.status_code}'
-                
-        except requests.exceptions.Timeout:
-            result['error'] = 'Giveaway service timeout'
-        except requests.exceptions.ConnectionError:
-            result['error'] = 'Giveaway service unavailable'
-        except Exception as e:
-            result['error'] = f'Get giveaway info error: {str(e)}'
+            except ValueError:
+                return {'success': False, 'giveaway_info': None, 'error': 'Invalid giveaway service response'}
+            
+            result = {
+                'success': True,
+                'giveaway_info': data.get('giveaway_info'),
+                'error': None
+            }
+            self._giveaway_cache[giveaway_id] = dict(result)
+            return result
         
-        return result
+        if response.status_code == 404:
+            error = 'Giveaway not found'
+        else:
+            error = f'Failed to get giveaway info: {response.status_code}'
+        return {'success': False, 'giveaway_info': None, 'error': error}
     
     def validate_account_access(self, account_id, user_id=None):
         """
@@ -197,47 +436,35 @@ class TelegiveService:
         Returns:
             dict: Validation result
         """
-        result = {
-            'valid': False,
-            'error': None
-        }
+        cache_key = (account_id, user_id)
+        cached = self._access_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
         
-        try:
-            if not self.service_url:
-                result['error'] = 'Giveaway service URL not configured'
-                return result
-            
-            params = {'account_id': account_id}
-            if user_id:
-                params['user_id'] = user_id
-            
-            response = requests.get(
-                f"{self.service_url}/api/accounts/validate-access",
-                params=params,
-                headers={
-                    'Authorization': f'Bearer {self.service_token}',
-                    'X-Service-Name': 'media-service'
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
+        params = {'account_id': account_id}
+        if user_id:
+            params['user_id'] = user_id
+        
+        response, error = self._request('GET', '/api/accounts/validate-access', params=params)
+        
+        if error:
+            return {'valid': False, 'error': error}
+        
+        if response.status_code == 200:
+            try:
                 data = response.json()
-                result.update({
-                    'valid': data.get('valid', False),
-                    'permissions': data.get('permissions', [])
-                })
-            else:
-                result['error'] = f'Access validation failed: {response.status_code}'
-                
-        except requests.exceptions.Timeout:
-            result['error'] = 'Giveaway service timeout'
-        except requests.exceptions.ConnectionError:
-            result['error'] = 'Giveaway service unavailable'
-        except Exception as e:
-            result['error'] = f'Access validation error: {str(e)}'
+            except ValueError:
+                return {'valid': False, 'error': 'Invalid giveaway service response'}
+            
+            result = {
+                'valid': data.get('valid', False),
+                'error': None,
+                'permissions': data.get('permissions', [])
+            }
+            self._access_cache[cache_key] = dict(result)
+            return result
         
-        return result
+        return {'valid': False, 'error': f'Access validation failed: {response.status_code}'}
     
     def report_cleanup_completed(self, giveaway_id, cleanup_summary):
         """
@@ -250,46 +477,28 @@ class TelegiveService:
         Returns:
             dict: Report result
         """
-        result = {
-            'success': False,
-            'error': None
+        payload = {
+            'giveaway_id': giveaway_id,
+            'cleanup_summary': cleanup_summary,
+            'timestamp': datetime.utcnow().isoformat()
         }
         
-        try:
-            if not self.service_url:
-                result['error'] = 'Giveaway service URL not configured'
-                return result
-            
-            payload = {
-                'giveaway_id': giveaway_id,
-                'cleanup_summary': cleanup_summary,
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
-            response = requests.post(
-                f"{self.service_url}/api/giveaways/{giveaway_id}/cleanup-completed",
-                json=payload,
-                headers={
-                    'Authorization': f'Bearer {self.service_token}',
-                    'Content-Type': 'application/json',
-                    'X-Service-Name': 'media-service'
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code in [200, 201]:
-                result['success'] = True
-            else:
-                result['error'] = f'Report failed: {response.status_code}'
-                
-        except requests.exceptions.Timeout:
-            result['error'] = 'Giveaway service timeout'
-        except requests.exceptions.ConnectionError:
-            result['error'] = 'Giveaway service unavailable'
-        except Exception as e:
-            result['error'] = f'Report error: {str(e)}'
+        response, error = self._request(
+            'POST',
+            f'/api/giveaways/{giveaway_id}/cleanup-completed',
+            json=payload,
+            headers={'Idempotency-Key': f'cleanup-completed-{giveaway_id}'}
+        )
         
-        return result
+        if error:
+            return {'success': False, 'error': error}
+        
+        if response.status_code in [200, 201]:
+            # Giveaway state changed upstream
+            self.invalidate_giveaway(giveaway_id)
+            return {'success': True, 'error': None}
+        
+        return {'success': False, 'error': f'Report failed: {response.status_code}'}
     
     def get_service_health(self):
         """
@@ -301,48 +510,48 @@ class TelegiveService:
         result = {
             'healthy': False,
             'response_time_ms': None,
+            'circuit': self._breaker.state,
             'error': None
         }
         
-        try:
-            if not self.service_url:
-                result['error'] = 'Giveaway service URL not configured'
-                return result
-            
-            start_time = datetime.utcnow()
-            
-            response = requests.get(
-                f"{self.service_url}/health",
-                timeout=10  # Shorter timeout for health check
-            )
-            
-            end_time = datetime.utcnow()
-            response_time = (end_time - start_time).total_seconds() * 1000
-            
-            result['response_time_ms'] = round(response_time, 2)
-            
-            if response.status_code == 200:
-                result['healthy'] = True
-            else:
-                result['error'] = f'Health check failed: {response.status_code}'
-                
-        except requests.exceptions.Timeout:
-            result['error'] = 'Health check timeout'
-        except requests.exceptions.ConnectionError:
-            result['error'] = 'Service unavailable'
-        except Exception as e:
-            result['error'] = f'Health check error: {str(e)}'
+        start_time = time.perf_counter()
+        
+        # Bypass the breaker so health reflects the service, not the circuit
+        response, error = self._request(
+            'GET',
+            '/health',
+            timeout=10,  # Shorter timeout for health check
+            use_breaker=False
+        )
+        
+        if error:
+            result['error'] = error
+            return result
+        
+        result['response_time_ms'] = round((time.perf_counter() - start_time) * 1000, 2)
+        
+        if response.status_code == 200:
+            result['healthy'] = True
+        else:
+            result['error'] = f'Health check failed: {response.status_code}'
         
         return result
     
+    def invalidate_giveaway(self, giveaway_id):
+        """Drop cached giveaway info for a giveaway"""
+        self._giveaway_cache.pop(giveaway_id)
+    
     def refresh_service_token(self):
         """Refresh service authentication token"""
         try:
-            from services.auth_service import auth_service
+            auth_service = self.auth_service
+            if auth_service is None:
+                from services.auth_service import auth_service
             self.service_token = auth_service.generate_service_token(
                 'media-service',
                 permissions=['media_management', 'file_cleanup']
             )
+            self._apply_service_token()
             return True
         except Exception as e:
             current_app.logger.error(f'Failed to refresh service token: {e}')
@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class WebhookDispatcher:
+    """Deliver webhook events from a background thread, coalescing bursts into batches"""
+    
+    def __init__(self, send_one, send_batch=None, max_queue_size=1000, max_attempts=3,
+                 max_batch_size=50, max_batch_delay=0.2):
+        """
+        Args:
+            send_one: Callable(payload, event_key) delivering a single event
+            send_batch: Optional callable([(payload, event_key), ...]) delivering
+                several events in one request
+            max_queue_size: Maximum number of undelivered events
+            max_attempts: Delivery attempts per event before giving up
+            max_batch_size: Maximum events per batch request
+            max_batch_delay: Seconds to wait for more events before flushing
+        """
+        self.send_one = send_one
+        self.send_batch = send_batch
+        self.max_attempts = max_attempts
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self._batch_supported = send_batch is not None
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def _ensure_started(self):
+        """Start the worker thread on first use"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='webhook-dispatcher',
+                    daemon=True
+                )
+                self._thread.start()
+    
+    def submit(self, payload, event_key):
+        """
+        Queue a webhook event for background delivery
+        
+        Args:
+            payload: Event body
+            event_key: Unique event key, used for idempotency and logging
+        
+        Returns:
+            bool: True if queued, False if the queue is full
+        """
+        self._ensure_started()
+        
+        try:
+            self._queue.put_nowait((payload, event_key, 1))
+            return True
+        except queue.Full:
+            logger.warning(f'Webhook queue full, dropping {event_key}')
+            return False
+    
+    def _next_batch(self):
+        """Block for one event, then collect more until the batch is full or the delay elapses"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_batch_delay
+        
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def _run(self):
+        """Worker loop: deliver queued events, re-queueing failures"""
+        while True:
+            batch = self._next_batch()
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                logger.error(f'Webhook delivery error: {e}')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _deliver(self, batch):
+        """Deliver a batch in one request when possible, otherwise event by event"""
+        if len(batch) > 1 and self._batch_supported:
+            result = self.send_batch([(payload, event_key) for payload, event_key, _ in batch])
+            if result.get('success'):
+                return
+            
+            if result.get('status_code') == 404:
+                logger.info('Batch webhook endpoint not available, falling back to per-event delivery')
+                self._batch_supported = False
+            else:
+                for item in batch:
+                    self._retry(item, result.get('error'))
+                return
+        
+        for item in batch:
+            payload, event_key, _ = item
+            result = self.send_one(payload, event_key)
+            if not result.get('success'):
+                self._retry(item, result.get('error'))
+    
+    def _retry(self, item, error):
+        """Re-queue a failed event until attempts are exhausted"""
+        payload, event_key, attempt = item
+        
+        if attempt >= self.max_attempts:
+            logger.error(f'Webhook {event_key} failed after {attempt} attempts: {error}')
+            return
+        
+        logger.warning(f'Webhook {event_key} failed (attempt {attempt}): {error}')
+        try:
+            self._queue.put_nowait((payload, event_key, attempt + 1))
+        except queue.Full:
+            logger.error(f'Webhook queue full, dropping retry of {event_key}')
+    
+    def flush(self):
+        """Block until all queued events have been processed"""
+        self._queue.join()
+    
+    def get_queue_size(self):
+        """Get number of events waiting for delivery"""
+        return self._queue.qsize()
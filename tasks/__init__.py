@@ -1,16 +1,34 @@
 # Tasks package initialization
 
-from .cleanup_tasks import cleanup_tasks
-from .validation_tasks import validation_tasks
-from .scheduler import task_scheduler
-
-# Export all task instances
+# Task instances are imported on first access (PEP 562) so processes that
+# never run tasks don't pay for APScheduler and the models at import time
 __all__ = [
     'cleanup_tasks',
     'validation_tasks',
     'task_scheduler'
 ]
 
+def _load_exports():
+    """Import the task modules and bind their instances on the package"""
+    from .cleanup_tasks import cleanup_tasks
+    from .validation_tasks import validation_tasks
+    from .scheduler import task_scheduler
+    
+    # Importing a submodule binds the module object under the same name,
+    # so rebind the instances afterwards
+    exports = {
+        'cleanup_tasks': cleanup_tasks,
+        'validation_tasks': validation_tasks,
+        'task_scheduler': task_scheduler
+    }
+    globals().update(exports)
+    return exports
+
+def __getattr__(name):
+    if name in __all__:
+        return _load_exports()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 def init_tasks(app):
     """Initialize all tasks with Flask app"""
     
@@ -20,6 +38,7 @@ def init_tasks(app):
     
     if not testing_mode and scheduler_enabled:
         try:
+            task_scheduler = _load_exports()['task_scheduler']
             task_scheduler.init_app(app)
             
             # Start scheduler in a separate thread to avoid blocking
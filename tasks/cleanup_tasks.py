@@ -1,22 +1,41 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from flask import current_app
 from sqlalchemy import and_
 
-from models import db, MediaFile, FileCleanupLog
+from models import db, MediaFile, FileValidationLog, FileCleanupLog
 from utils import file_storage
 from services import telegive_service
 
+def _unlink_file(file_path):
+    """
+    Remove a file from disk, treating an already-missing file as removed
+    
+    Returns:
+        tuple: (success, bytes freed, error message)
+    """
+    try:
+        file_size = os.stat(file_path).st_size
+        os.remove(file_path)
+        return True, file_size, None
+    except FileNotFoundError:
+        return True, 0, None
+    except Exception as e:
+        return False, 0, str(e)
+
 class CleanupTasks:
     """Scheduled cleanup tasks for media files"""
     
     def __init__(self):
         self.batch_size = 100
+        self.chunk_size = 500
         self.retry_attempts = 3
     
     def init_app(self, app):
         """Initialize with Flask app"""
         self.batch_size = app.config.get('CLEANUP_BATCH_SIZE', 100)
+        self.chunk_size = app.config.get('CLEANUP_CHUNK_SIZE', 500)
         self.retry_attempts = app.config.get('CLEANUP_RETRY_ATTEMPTS', 3)
     
     def cleanup_scheduled_files(self):
@@ -24,96 +43,157 @@ class CleanupTasks:
         Clean up files that are scheduled for cleanup
         
         This task runs periodically to clean up files that have been
-        scheduled for cleanup after giveaway publishing.
+        scheduled for cleanup after giveaway publishing. Files are fetched
+        and committed in chunks so memory and lock duration stay bounded
+        regardless of the configured batch size.
         """
-        with current_app.app_context():
-            try:
-                current_app.logger.info('Starting scheduled file cleanup')
-                
-                # Find files scheduled for cleanup
-                cutoff_time = datetime.utcnow()
+        try:
+            current_app.logger.info('Starting scheduled file cleanup')
+            
+            # Find files scheduled for cleanup
+            cutoff_time = datetime.utcnow()
+            
+            cleanup_stats = {
+                'files_processed': 0,
+                'files_cleaned': 0,
+                'space_freed': 0,
+                'errors': []
+            }
+            
+            # Keyset pagination on id - failed files stay pending, so an
+            # offset-free cursor is needed to avoid picking them up again
+            last_id = 0
+            
+            while cleanup_stats['files_processed'] < self.batch_size:
+                chunk_limit = min(self.chunk_size, self.batch_size - cleanup_stats['files_processed'])
                 
                 files_to_cleanup = MediaFile.query.filter(
                     and_(
                         MediaFile.cleanup_status == 'pending',
                         MediaFile.cleanup_scheduled_at <= cutoff_time,
-                        MediaFile.is_active == True
+                        MediaFile.is_active == True,
+                        MediaFile.id > last_id
                     )
-                ).limit(self.batch_size).all()
+                ).order_by(MediaFile.id).limit(chunk_limit).all()
                 
                 if not files_to_cleanup:
-                    current_app.logger.debug('No files scheduled for cleanup')
-                    return {
-                        'success': True,
-                        'files_processed': 0,
-                        'files_cleaned': 0,
-                        'errors': []
-                    }
+                    break
                 
-                cleanup_stats = {
-                    'files_processed': len(files_to_cleanup),
-                    'files_cleaned': 0,
-                    'space_freed': 0,
-                    'errors': []
-                }
+                last_id = files_to_cleanup[-1].id
+                cleanup_stats['files_processed'] += len(files_to_cleanup)
                 
-                for media_file in files_to_cleanup:
-                    try:
-                        result = self._cleanup_single_file(media_file)
-                        
-                        if result['success']:
-                            cleanup_stats['files_cleaned'] += 1
-                            cleanup_stats['space_freed'] += result.get('space_freed', 0)
-                        else:
-                            cleanup_stats['errors'].append({
-                                'file_id': media_file.id,
-                                'error': result.get('error', 'Unknown error')
-                            })
-                            
-                    except Exception as e:
-                        error_msg = f'Error cleaning up file {media_file.id}: {str(e)}'
-                        cleanup_stats['errors'].append({
-                            'file_id': media_file.id,
-                            'error': error_msg
-                        })
-                        current_app.logger.error(error_msg)
+                self._cleanup_chunk(files_to_cleanup, cleanup_stats)
                 
-                # Commit all changes
+                # Commit each chunk to release row locks
                 db.session.commit()
-                
-                current_app.logger.info(
-                    f'Cleanup completed: {cleanup_stats["files_cleaned"]}/{cleanup_stats["files_processed"]} files cleaned, '
-                    f'{cleanup_stats["space_freed"]} bytes freed'
-                )
-                
+            
+            if not cleanup_stats['files_processed']:
+                current_app.logger.debug('No files scheduled for cleanup')
                 return {
                     'success': True,
-                    **cleanup_stats
+                    'files_processed': 0,
+                    'files_cleaned': 0,
+                    'errors': []
                 }
-                
+            
+            current_app.logger.info(
+                'Cleanup completed: %d/%d files cleaned, %d bytes freed',
+                cleanup_stats['files_cleaned'],
+                cleanup_stats['files_processed'],
+                cleanup_stats['space_freed']
+            )
+            
+            return {
+                'success': True,
+                **cleanup_stats
+            }
+            
+        except Exception as e:
+            db.session.rollback()
+            error_msg = f'Scheduled cleanup failed: {str(e)}'
+            current_app.logger.error(error_msg)
+            return {
+                'success': False,
+                'error': error_msg
+            }
+    
+    def _cleanup_chunk(self, files_to_cleanup, cleanup_stats):
+        """
+        Clean up a chunk of media files and stage their database changes
+        
+        Args:
+            files_to_cleanup: List of MediaFile instances
+            cleanup_stats: Statistics dict updated in place
+        """
+        # One timestamp for the whole chunk, so the bulk INSERT carries
+        # precomputed values instead of calling the column default per row
+        now = datetime.utcnow()
+        cleaned_ids = []
+        failed_rows = []
+        log_rows = []
+        
+        for media_file in files_to_cleanup:
+            try:
+                result = self._cleanup_single_file(media_file)
+                
+                if result.get('log'):
+                    log_rows.append({**result['log'], 'cleanup_timestamp': now})
+                
+                if result['success']:
+                    cleaned_ids.append(media_file.id)
+                    cleanup_stats['files_cleaned'] += 1
+                    cleanup_stats['space_freed'] += result.get('space_freed', 0)
+                else:
+                    if result.get('log'):
+                        failed_rows.append({
+                            'id': media_file.id,
+                            'cleanup_error': result['error']
+                        })
+                    cleanup_stats['errors'].append({
+                        'file_id': media_file.id,
+                        'error': result.get('error', 'Unknown error')
+                    })
+                    
             except Exception as e:
-                db.session.rollback()
-                error_msg = f'Scheduled cleanup failed: {str(e)}'
-                current_app.logger.error(error_msg)
-                return {
-                    'success': False,
+                error_msg = f'Error cleaning up file {media_file.id}: {str(e)}'
+                cleanup_stats['errors'].append({
+                    'file_id': media_file.id,
                     'error': error_msg
-                }
+                })
+                current_app.logger.error(error_msg)
+        
+        # Apply status updates and cleanup logs in bulk
+        if cleaned_ids:
+            MediaFile.query.filter(MediaFile.id.in_(cleaned_ids)).update({
+                'cleanup_status': 'published_and_removed',
+                'cleanup_completed_at': now,
+                'is_active': False
+            }, synchronize_session=False)
+        
+        if failed_rows:
+            db.session.bulk_update_mappings(MediaFile, failed_rows)
+        
+        if log_rows:
+            db.session.bulk_insert_mappings(FileCleanupLog, log_rows)
     
     def _cleanup_single_file(self, media_file):
         """
         Clean up a single media file
         
+        Database changes are not applied here; the caller writes the
+        returned log row and status update in bulk for the whole batch.
+        
         Args:
             media_file: MediaFile instance
         
         Returns:
-            dict: Cleanup result
+            dict: Cleanup result, with 'log' holding the FileCleanupLog row
         """
         result = {
             'success': False,
             'space_freed': 0,
-            'error': None
+            'error': None,
+            'log': None
         }
         
         try:
@@ -121,36 +201,30 @@ class CleanupTasks:
             deletion_result = file_storage.delete_file(media_file.file_path)
             
             if deletion_result['success']:
-                # Update database record
-                media_file.mark_cleanup_completed()
                 result['success'] = True
                 result['space_freed'] = deletion_result.get('file_size_freed', 0)
                 
-                # Create cleanup log
-                cleanup_log = FileCleanupLog.create_log(
-                    media_file.id,
-                    'scheduled',
-                    True,
-                    file_size_freed=result['space_freed']
-                )
-                db.session.add(cleanup_log)
+                result['log'] = {
+                    'media_file_id': media_file.id,
+                    'cleanup_trigger': 'scheduled',
+                    'cleanup_success': True,
+                    'file_size_freed': result['space_freed']
+                }
                 
-                current_app.logger.debug(f'File {media_file.id} cleaned up successfully')
+                current_app.logger.debug('File %s cleaned up successfully', media_file.id)
                 
             else:
                 # Log cleanup failure
                 result['error'] = deletion_result.get('error', 'Unknown deletion error')
-                media_file.cleanup_error = result['error']
                 
-                cleanup_log = FileCleanupLog.create_log(
-                    media_file.id,
-                    'scheduled',
-                    False,
-                    error_message=result['error']
-                )
-                db.session.add(cleanup_log)
+                result['log'] = {
+                    'media_file_id': media_file.id,
+                    'cleanup_trigger': 'scheduled',
+                    'cleanup_success': False,
+                    'error_message': result['error']
+                }
                 
-                current_app.logger.warning(f'Failed to clean up file {media_file.id}: {result["error"]}')
+                current_app.logger.warning('Failed to clean up file %s: %s', media_file.id, result['error'])
                 
         except Exception as e:
             result['error'] = str(e)
@@ -158,6 +232,26 @@ class CleanupTasks:
         
         return result
     
+    def _iter_files(self, folder):
+        """
+        Recursively yield os.DirEntry objects for regular files under folder
+        
+        Like os.walk, unreadable directories are skipped rather than
+        aborting the whole walk.
+        """
+        try:
+            entries = os.scandir(folder)
+        except OSError as e:
+            current_app.logger.warning('Skipping unreadable directory %s: %s', folder, e)
+            return
+        
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._iter_files(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+    
     def cleanup_orphaned_files(self):
         """
         Clean up orphaned files (files on disk without database records)
@@ -165,71 +259,70 @@ class CleanupTasks:
         This task runs less frequently to clean up any files that may have
         been left on disk without corresponding database records.
         """
-        with current_app.app_context():
-            try:
-                current_app.logger.info('Starting orphaned file cleanup')
-                
-                upload_folder = current_app.config.get('UPLOAD_FOLDER', '/app/uploads')
-                
-                if not os.path.exists(upload_folder):
-                    return {
-                        'success': True,
-                        'message': 'Upload folder does not exist'
-                    }
-                
-                orphaned_files = []
-                total_size_freed = 0
-                
-                # Walk through all files in upload directory
-                for root, dirs, files in os.walk(upload_folder):
-                    for file in files:
-                        if file == '.gitkeep':  # Skip placeholder files
-                            continue
-                        
-                        file_path = os.path.join(root, file)
-                        
-                        # Check if file exists in database
-                        media_file = MediaFile.query.filter_by(file_path=file_path).first()
-                        
-                        if not media_file:
-                            # Orphaned file found
-                            try:
-                                file_size = os.path.getsize(file_path)
-                                os.remove(file_path)
-                                
-                                orphaned_files.append({
-                                    'path': file_path,
-                                    'size': file_size
-                                })
-                                total_size_freed += file_size
-                                
-                                current_app.logger.info(f'Removed orphaned file: {file_path}')
-                                
-                            except Exception as e:
-                                current_app.logger.error(f'Failed to remove orphaned file {file_path}: {e}')
-                
-                # Clean up empty directories
-                file_storage.cleanup_empty_directories()
-                
-                current_app.logger.info(
-                    f'Orphaned file cleanup completed: {len(orphaned_files)} files removed, '
-                    f'{total_size_freed} bytes freed'
-                )
-                
+        try:
+            current_app.logger.info('Starting orphaned file cleanup')
+            
+            upload_folder = current_app.config.get('UPLOAD_FOLDER', '/app/uploads')
+            
+            if not os.path.exists(upload_folder):
                 return {
                     'success': True,
-                    'orphaned_files_removed': len(orphaned_files),
-                    'space_freed': total_size_freed,
-                    'files': orphaned_files
+                    'message': 'Upload folder does not exist'
                 }
+            
+            # Load all known paths in one query instead of one query per file
+            known_paths = {
+                file_path for (file_path,) in
+                db.session.query(MediaFile.file_path).yield_per(10000)
+            }
+            
+            orphaned_files = []
+            total_size_freed = 0
+            
+            for entry in self._iter_files(upload_folder):
+                if entry.name == '.gitkeep':  # Skip placeholder files
+                    continue
                 
-            except Exception as e:
-                error_msg = f'Orphaned file cleanup failed: {str(e)}'
-                current_app.logger.error(error_msg)
-                return {
-                    'success': False,
-                    'error': error_msg
-                }
+                if entry.path not in known_paths:
+                    # Orphaned file found
+                    try:
+                        file_size = entry.stat(follow_symlinks=False).st_size
+                        os.remove(entry.path)
+                        
+                        orphaned_files.append({
+                            'path': entry.path,
+                            'size': file_size
+                        })
+                        total_size_freed += file_size
+                        
+                        current_app.logger.info('Removed orphaned file: %s', entry.path)
+                        
+                    except Exception as e:
+                        current_app.logger.error(f'Failed to remove orphaned file {entry.path}: {e}')
+            
+            # Clean up empty directories
+            file_storage.cleanup_empty_directories()
+            
+            current_app.logger.info(
+                'Orphaned file cleanup completed: %d files removed, %d bytes freed',
+                len(orphaned_files),
+                total_size_freed
+            )
+            
+            return {
+                'success': True,
+                'orphaned_files_removed': len(orphaned_files),
+                'space_freed': total_size_freed,
+                'files': orphaned_files
+            }
+            
+        except Exception as e:
+            error_msg = f'Orphaned file cleanup failed: {str(e)}'
+            current_app.logger.error(error_msg)
+            return {
+                'success': False,
+                'error': error_msg
+            }
     
     def cleanup_old_inactive_files(self, days_old=30):
         """
@@ -238,66 +331,77 @@ class CleanupTasks:
         Args:
             days_old: Number of days after which inactive files should be cleaned
         """
-        with current_app.app_context():
-            try:
-                current_app.logger.info(f'Starting cleanup of inactive files older than {days_old} days')
-                
-                cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-                
-                old_files = MediaFile.query.filter(
-                    and_(
-                        MediaFile.is_active == False,
-                        MediaFile.cleanup_completed_at <= cutoff_date
-                    )
-                ).limit(self.batch_size).all()
-                
-                if not old_files:
-                    return {
-                        'success': True,
-                        'files_processed': 0,
-                        'message': 'No old inactive files to clean'
-                    }
-                
-                files_removed = 0
-                space_freed = 0
-                
-                for media_file in old_files:
-                    try:
-                        # Remove file from disk if it still exists
-                        if os.path.exists(media_file.file_path):
-                            file_size = os.path.getsize(media_file.file_path)
-                            os.remove(media_file.file_path)
-                            space_freed += file_size
-                        
-                        # Remove database record
-                        db.session.delete(media_file)
-                        files_removed += 1
-                        
-                    except Exception as e:
-                        current_app.logger.error(f'Failed to remove old file {media_file.id}: {e}')
-                
-                db.session.commit()
-                
-                current_app.logger.info(
-                    f'Old file cleanup completed: {files_removed} files removed, '
-                    f'{space_freed} bytes freed'
+        try:
+            current_app.logger.info('Starting cleanup of inactive files older than %s days', days_old)
+            
+            cutoff_date = datetime.utcnow() - timedelta(days=days_old)
+            
+            old_files = MediaFile.query.filter(
+                and_(
+                    MediaFile.is_active == False,
+                    MediaFile.cleanup_completed_at <= cutoff_date
                 )
-                
+            ).limit(self.batch_size).all()
+            
+            if not old_files:
                 return {
                     'success': True,
-                    'files_processed': len(old_files),
-                    'files_removed': files_removed,
-                    'space_freed': space_freed
-                }
-                
-            except Exception as e:
-                db.session.rollback()
-                error_msg = f'Old file cleanup failed: {str(e)}'
-                current_app.logger.error(error_msg)
-                return {
-                    'success': False,
-                    'error': error_msg
+                    'files_processed': 0,
+                    'message': 'No old inactive files to clean'
                 }
+            
+            # Unlink in parallel - disk deletes are latency-bound
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                unlink_results = list(executor.map(
+                    _unlink_file, [media_file.file_path for media_file in old_files]
+                ))
+            
+            removed_ids = []
+            space_freed = 0
+            
+            for media_file, (success, file_size, error) in zip(old_files, unlink_results):
+                if success:
+                    removed_ids.append(media_file.id)
+                    space_freed += file_size
+                else:
+                    current_app.logger.error(f'Failed to remove old file {media_file.id}: {error}')
+            
+            if removed_ids:
+                # Bulk DELETEs skip ORM cascades, so remove dependent logs explicitly
+                FileValidationLog.query.filter(
+                    FileValidationLog.media_file_id.in_(removed_ids)
+                ).delete(synchronize_session=False)
+                FileCleanupLog.query.filter(
+                    FileCleanupLog.media_file_id.in_(removed_ids)
+                ).delete(synchronize_session=False)
+                MediaFile.query.filter(
+                    MediaFile.id.in_(removed_ids)
+                ).delete(synchronize_session=False)
+            
+            files_removed = len(removed_ids)
+            db.session.commit()
+            
+            current_app.logger.info(
+                'Old file cleanup completed: %d files removed, %d bytes freed',
+                files_removed,
+                space_freed
+            )
+            
+            return {
+                'success': True,
+                'files_processed': len(old_files),
+                'files_removed': files_removed,
+                'space_freed': space_freed
+            }
+            
+        except Exception as e:
+            db.session.rollback()
+            error_msg = f'Old file cleanup failed: {str(e)}'
+            current_app.logger.error(error_msg)
+            return {
+                'success': False,
+                'error': error_msg
+            }
     
     def get_cleanup_statistics(self):
         """
@@ -306,43 +410,45 @@ class CleanupTasks:
         Returns:
             dict: Cleanup statistics
         """
-        with current_app.app_context():
-            try:
-                stats = {
-                    'pending_cleanup': MediaFile.query.filter_by(cleanup_status='pending').count(),
-                    'completed_cleanup': MediaFile.query.filter_by(cleanup_status='published_and_removed').count(),
-                    'permanent_files': MediaFile.query.filter_by(cleanup_status='permanent').count(),
-                    'active_files': MediaFile.query.filter_by(is_active=True).count(),
-                    'inactive_files': MediaFile.query.filter_by(is_active=False).count(),
-                    'total_files': MediaFile.query.count()
-                }
-                
-                # Calculate total size of active files
-                total_size = db.session.query(
-                    db.func.sum(MediaFile.file_size)
-                ).filter(MediaFile.is_active == True).scalar() or 0
-                
-                stats['total_active_size'] = total_size
-                
-                # Get recent cleanup logs
-                recent_cleanups = FileCleanupLog.query.filter(
-                    FileCleanupLog.cleanup_timestamp >= datetime.utcnow() - timedelta(days=7)
-                ).count()
-                
-                stats['recent_cleanups'] = recent_cleanups
-                
-                return {
-                    'success': True,
-                    'statistics': stats
-                }
-                
-            except Exception as e:
-                error_msg = f'Failed to get cleanup statistics: {str(e)}'
-                current_app.logger.error(error_msg)
-                return {
-                    'success': False,
-                    'error': error_msg
-                }
+        try:
+            count = db.func.count(MediaFile.id)
+            
+            # Recent cleanup log count, evaluated in the same statement
+            recent_cleanups = db.session.query(
+                db.func.count(FileCleanupLog.id)
+            ).filter(
+                FileCleanupLog.cleanup_timestamp >= datetime.utcnow() - timedelta(days=7)
+            ).scalar_subquery()
+            
+            # One round-trip using conditional aggregation
+            row = db.session.query(
+                count.filter(MediaFile.cleanup_status == 'pending').label('pending_cleanup'),
+                count.filter(MediaFile.cleanup_status == 'published_and_removed').label('completed_cleanup'),
+                count.filter(MediaFile.cleanup_status == 'permanent').label('permanent_files'),
+                count.filter(MediaFile.is_active == True).label('active_files'),
+                count.filter(MediaFile.is_active == False).label('inactive_files'),
+                count.label('total_files'),
+                db.func.sum(MediaFile.file_size).filter(MediaFile.is_active == True).label('total_active_size'),
+                recent_cleanups.label('recent_cleanups')
+            ).one()
+            
+            stats = dict(row._mapping)
+            
+            # SUM over no rows is NULL
+            stats['total_active_size'] = stats['total_active_size'] or 0
+            
+            return {
+                'success': True,
+                'statistics': stats
+            }
+            
+        except Exception as e:
+            error_msg = f'Failed to get cleanup statistics: {str(e)}'
+            current_app.logger.error(error_msg)
+            return {
+                'success': False,
+                'error': error_msg
+            }
 
 # Global cleanup tasks instance
 cleanup_tasks = CleanupTasks()
@@ -1,6 +1,12 @@
 import atexit
+import functools
+import itertools
+import os
+import threading
+import time
+from apscheduler.events import EVENT_JOB_ADDED, EVENT_JOB_MODIFIED, EVENT_JOB_REMOVED
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor
 from flask import current_app
 
@@ -13,18 +19,36 @@ class TaskScheduler:
     def __init__(self):
         self.scheduler = None
         self.is_running = False
+        self.delete_batch_size = 1000
+        self.job_status_ttl = 5  # seconds
+        self.job_jitter = 30  # seconds; spreads interval jobs so they don't fire together
+        self._jobs_cache = None
+        self._jobs_cache_at = 0
+        self._app = None
+        self._executor = None
+        self._executor_alias = 'default'
+        self._max_workers = None
+        self._executor_seq = itertools.count(1)
+        self._resize_lock = threading.Lock()
     
     def init_app(self, app):
         """Initialize scheduler with Flask app"""
+        self.delete_batch_size = app.config.get('MAINTENANCE_DELETE_BATCH_SIZE', 1000)
+        self._app = app
         
-        # Configure job stores
+        # Configure job stores - every job is re-registered by start() with
+        # replace_existing, so persisting them would only add a DB write per run
         jobstores = {
-            'default': SQLAlchemyJobStore(url=app.config.get('DATABASE_URL'))
+            'default': MemoryJobStore()
         }
         
         # Configure executors
+        # Same sizing heuristic as concurrent.futures; set 1 to serialize jobs
+        default_workers = min(32, (os.cpu_count() or 1) + 4)
+        self._max_workers = app.config.get('SCHEDULER_MAX_WORKERS', default_workers)
+        self._executor = self._build_executor(self._max_workers)
         executors = {
-            'default': ThreadPoolExecutor(max_workers=app.config.get('SCHEDULER_MAX_WORKERS', 4))
+            self._executor_alias: self._executor
         }
         
         # Job defaults
@@ -42,6 +66,12 @@ class TaskScheduler:
             timezone='UTC'
         )
         
+        # Drop the cached job listing whenever the job set changes
+        self.scheduler.add_listener(
+            self._invalidate_jobs_cache,
+            EVENT_JOB_ADDED | EVENT_JOB_MODIFIED | EVENT_JOB_REMOVED
+        )
+        
         # Initialize task instances
         cleanup_tasks.init_app(app)
         validation_tasks.init_app(app)
@@ -49,6 +79,43 @@ class TaskScheduler:
         # Register cleanup on app shutdown
         atexit.register(self.shutdown)
     
+    def _build_executor(self, max_workers):
+        """Thread pool executor whose worker threads run inside the app context"""
+        # Each worker thread pushes the app context once, when it starts,
+        # instead of every job pushing and popping its own
+        return ThreadPoolExecutor(
+            max_workers=max_workers,
+            pool_kwargs={
+                'initializer': self._push_app_context,
+                'initargs': (self._app,)
+            }
+        )
+    
+    @staticmethod
+    def _push_app_context(app):
+        """Executor thread initializer: keep an app context pushed for the thread's lifetime"""
+        app.app_context().push()
+    
+    @staticmethod
+    def _with_session_cleanup(func):
+        """
+        Wrap a job so it removes its thread's db.session when it finishes
+        
+        The app context pushed by _push_app_context is never popped, so its
+        teardown never removes the session; without this, a read-only job
+        would leave its connection idle in a transaction.
+        """
+        @functools.wraps(func)
+        def job(*args, **kwargs):
+            from models import db
+            
+            try:
+                return func(*args, **kwargs)
+            finally:
+                db.session.remove()
+        
+        return job
+    
     def start(self):
         """Start the scheduler and add jobs"""
         if self.is_running:
@@ -78,32 +145,37 @@ class TaskScheduler:
         
         # Scheduled file cleanup - every 5 minutes
         self.scheduler.add_job(
-            func=cleanup_tasks.cleanup_scheduled_files,
+            func=self._with_session_cleanup(cleanup_tasks.cleanup_scheduled_files),
             trigger='interval',
             minutes=5,
+            jitter=self.job_jitter,
             id='cleanup_scheduled_files',
             name='Clean up scheduled files',
+            executor=self._executor_alias,
             replace_existing=True
         )
         
         # Orphaned file cleanup - every 6 hours
         self.scheduler.add_job(
-            func=cleanup_tasks.cleanup_orphaned_files,
+            func=self._with_session_cleanup(cleanup_tasks.cleanup_orphaned_files),
             trigger='interval',
             hours=6,
+            jitter=self.job_jitter,
             id='cleanup_orphaned_files',
             name='Clean up orphaned files',
+            executor=self._executor_alias,
             replace_existing=True
         )
         
         # Old inactive file cleanup - daily at 2 AM
         self.scheduler.add_job(
-            func=cleanup_tasks.cleanup_old_inactive_files,
+            func=self._with_session_cleanup(cleanup_tasks.cleanup_old_inactive_files),
             trigger='cron',
             hour=2,
             minute=0,
             id='cleanup_old_inactive_files',
             name='Clean up old inactive files',
+            executor=self._executor_alias,
             replace_existing=True
         )
     
@@ -112,21 +184,25 @@ class TaskScheduler:
         
         # Pending file validation - every 2 minutes
         self.scheduler.add_job(
-            func=validation_tasks.validate_pending_files,
+            func=self._with_session_cleanup(validation_tasks.validate_pending_files),
             trigger='interval',
             minutes=2,
+            jitter=self.job_jitter,
             id='validate_pending_files',
             name='Validate pending files',
+            executor=self._executor_alias,
             replace_existing=True
         )
         
         # Failed file revalidation - every 30 minutes
         self.scheduler.add_job(
-            func=validation_tasks.revalidate_failed_files,
+            func=self._with_session_cleanup(validation_tasks.revalidate_failed_files),
             trigger='interval',
             minutes=30,
+            jitter=self.job_jitter,
             id='revalidate_failed_files',
             name='Revalidate failed files',
+            executor=self._executor_alias,
             replace_existing=True
         )
     
@@ -135,22 +211,25 @@ class TaskScheduler:
         
         # Log cleanup statistics - every hour
         self.scheduler.add_job(
-            func=self._log_statistics,
+            func=self._with_session_cleanup(self._log_statistics),
             trigger='interval',
             hours=1,
+            jitter=self.job_jitter,
             id='log_statistics',
             name='Log system statistics',
+            executor=self._executor_alias,
             replace_existing=True
         )
         
         # Database maintenance - daily at 3 AM
         self.scheduler.add_job(
-            func=self._database_maintenance,
+            func=self._with_session_cleanup(self._database_maintenance),
             trigger='cron',
             hour=3,
             minute=0,
             id='database_maintenance',
             name='Database maintenance',
+            executor=self._executor_alias,
             replace_existing=True
         )
     
@@ -173,8 +252,6 @@ class TaskScheduler:
     def _database_maintenance(self):
         """Perform database maintenance tasks"""
         try:
-            from models import db
-            
             # Clean up old validation logs (older than 30 days)
             from datetime import datetime, timedelta
             from models import FileValidationLog, FileCleanupLog
@@ -182,16 +259,14 @@ class TaskScheduler:
             cutoff_date = datetime.utcnow() - timedelta(days=30)
             
             # Delete old validation logs
-            old_validation_logs = FileValidationLog.query.filter(
-                FileValidationLog.validated_at < cutoff_date
-            ).delete()
+            old_validation_logs = self._delete_in_batches(
+                FileValidationLog, FileValidationLog.validated_at < cutoff_date
+            )
             
             # Delete old cleanup logs
-            old_cleanup_logs = FileCleanupLog.query.filter(
-                FileCleanupLog.cleanup_timestamp < cutoff_date
-            ).delete()
-            
-            db.session.commit()
+            old_cleanup_logs = self._delete_in_batches(
+                FileCleanupLog, FileCleanupLog.cleanup_timestamp < cutoff_date
+            )
             
             current_app.logger.info(
                 f'Database maintenance completed: {old_validation_logs} validation logs, '
@@ -199,8 +274,42 @@ class TaskScheduler:
             )
             
         except Exception as e:
+            from models import db
+            db.session.rollback()
             current_app.logger.error(f'Database maintenance failed: {e}')
     
+    def _delete_in_batches(self, model, condition):
+        """
+        Delete matching rows by primary key in short transactions
+        
+        Args:
+            model: Model class to delete from
+            condition: Filter selecting rows to delete
+        
+        Returns:
+            int: Number of rows deleted
+        """
+        from models import db
+        
+        total_deleted = 0
+        
+        while True:
+            ids = [row_id for (row_id,) in db.session.query(model.id).filter(
+                condition
+            ).limit(self.delete_batch_size)]
+            
+            if not ids:
+                break
+            
+            total_deleted += model.query.filter(
+                model.id.in_(ids)
+            ).delete(synchronize_session=False)
+            
+            # Commit each batch so locks are held briefly
+            db.session.commit()
+        
+        return total_deleted
+    
     def stop(self):
         """Stop the scheduler"""
         if self.scheduler and self.is_running:
@@ -215,23 +324,88 @@ class TaskScheduler:
             self.is_running = False
             print('Task scheduler shutdown completed')
     
+    def set_max_workers(self, max_workers):
+        """
+        Resize the job worker pool without restarting the scheduler
+        
+        A pool's size is fixed once created, so a new executor of the
+        requested size is added under a fresh alias and every job is moved
+        to it. The old executor is removed and shut down without waiting;
+        jobs already running on it finish there.
+        
+        Args:
+            max_workers: New maximum number of worker threads (>= 1)
+        
+        Returns:
+            dict: Resize result
+        """
+        if not self.scheduler:
+            return {'success': False, 'error': 'Scheduler not initialized'}
+        
+        if not isinstance(max_workers, int) or isinstance(max_workers, bool) or max_workers < 1:
+            return {'success': False, 'error': 'max_workers must be a positive integer'}
+        
+        try:
+            with self._resize_lock:
+                previous_alias, previous_executor = self._executor_alias, self._executor
+                previous = self._max_workers
+                
+                alias = f'workers_{next(self._executor_seq)}'
+                executor = self._build_executor(max_workers)
+                self.scheduler.add_executor(executor, alias)
+                
+                for job in self.scheduler.get_jobs():
+                    if job.executor == previous_alias:
+                        job.modify(executor=alias)
+                
+                self._executor_alias, self._executor = alias, executor
+                self._max_workers = max_workers
+                
+                self.scheduler.remove_executor(previous_alias, shutdown=False)
+                previous_executor.shutdown(wait=False)
+            
+            return {
+                'success': True,
+                'previous_max_workers': previous,
+                'max_workers': max_workers
+            }
+            
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def _invalidate_jobs_cache(self, event=None):
+        """Forget the cached job listing"""
+        # No lock: listeners run under APScheduler's job store lock, and a
+        # plain assignment is atomic
+        self._jobs_cache = None
+    
     def get_job_status(self):
-        """Get status of all scheduled jobs"""
+        """
+        Get status of all scheduled jobs
+        
+        The job listing is cached for job_status_ttl seconds so frequent
+        polling doesn't contend for the scheduler's job store lock.
+        """
         if not self.scheduler:
             return {'error': 'Scheduler not initialized'}
         
-        jobs = []
-        for job in self.scheduler.get_jobs():
-            jobs.append({
-                'id': job.id,
-                'name': job.name,
-                'next_run_time': job.next_run_time.isoformat() if job.next_run_time else None,
-                'trigger': str(job.trigger)
-            })
+        jobs = self._jobs_cache
+        if jobs is None or time.monotonic() - self._jobs_cache_at >= self.job_status_ttl:
+            jobs = []
+            for job in self.scheduler.get_jobs():
+                jobs.append({
+                    'id': job.id,
+                    'name': job.name,
+                    'next_run_time': job.next_run_time.isoformat() if job.next_run_time else None,
+                    'trigger': str(job.trigger)
+                })
+            
+            self._jobs_cache = jobs
+            self._jobs_cache_at = time.monotonic()
         
         return {
             'scheduler_running': self.is_running,
-            'jobs': jobs
+            'jobs': list(jobs)
         }
     
     def run_job_now(self, job_id):
@@ -1,4 +1,9 @@
+import atexit
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 from flask import current_app
 from sqlalchemy import and_
@@ -9,16 +14,51 @@ from utils import (
     file_hasher, security_scanner
 )
 
+def _scan_in_subprocess(file_path, filename, mime_type):
+    """Process pool entry point: read the file and scan it with the worker process's own scanner"""
+    with open(file_path, 'rb') as f:
+        file_content = f.read()
+    
+    return security_scanner.scan_file(file_content, filename, mime_type)
+
 class ValidationTasks:
     """Scheduled validation tasks for media files"""
     
     def __init__(self):
         self.batch_size = 50
         self.validation_timeout = 300  # 5 minutes
+        self.max_workers = min(32, (os.cpu_count() or 1) * 5)
+        self._revalidation_cursor = 0  # Last file id revalidated, so runs cycle through all failures
+        self.scan_processes = min(4, os.cpu_count() or 1)
+        self._scan_pool = None
+        self._scan_pool_lock = threading.Lock()
     
     def init_app(self, app):
         """Initialize with Flask app"""
         self.batch_size = app.config.get('VALIDATION_BATCH_SIZE', 50)
+        self.max_workers = app.config.get('VALIDATION_WORKERS', self.max_workers)
+        self.scan_processes = app.config.get('SECURITY_SCAN_PROCESSES', self.scan_processes)
+    
+    def _get_scan_pool(self):
+        """
+        Lazily create the process pool for CPU-bound security scans
+        
+        Returns:
+            ProcessPoolExecutor or None if scanning in-process (SECURITY_SCAN_PROCESSES=0)
+        """
+        if self.scan_processes < 1:
+            return None
+        
+        with self._scan_pool_lock:
+            if self._scan_pool is None:
+                # spawn, not fork: the parent runs scheduler and validation threads
+                self._scan_pool = ProcessPoolExecutor(
+                    max_workers=self.scan_processes,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                atexit.register(self._scan_pool.shutdown, wait=False, cancel_futures=True)
+        
+        return self._scan_pool
     
     def validate_pending_files(self):
         """
@@ -27,145 +67,244 @@ class ValidationTasks:
         This task runs periodically to validate files that were uploaded
         but haven't completed the validation process.
         """
-        with current_app.app_context():
-            try:
-                current_app.logger.info('Starting pending file validation')
-                
-                # Find files that need validation
-                pending_files = MediaFile.query.filter(
-                    and_(
-                        MediaFile.is_validated == False,
-                        MediaFile.is_active == True
-                    )
-                ).limit(self.batch_size).all()
-                
-                if not pending_files:
-                    current_app.logger.debug('No pending files to validate')
-                    return {
-                        'success': True,
-                        'files_processed': 0,
-                        'files_validated': 0,
-                        'errors': []
-                    }
-                
-                validation_stats = {
-                    'files_processed': len(pending_files),
+        try:
+            current_app.logger.info('Starting pending file validation')
+            
+            # Find files that need validation; SKIP LOCKED lets concurrent
+            # scheduler instances take disjoint batches
+            pending_files = MediaFile.query.filter(
+                and_(
+                    MediaFile.is_validated == False,
+                    MediaFile.is_active == True
+                )
+            ).order_by(MediaFile.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+            
+            if not pending_files:
+                current_app.logger.debug('No pending files to validate')
+                return {
+                    'success': True,
+                    'files_processed': 0,
                     'files_validated': 0,
-                    'files_failed': 0,
                     'errors': []
                 }
-                
-                for media_file in pending_files:
-                    try:
-                        result = self._validate_single_file(media_file)
-                        
-                        if result['success']:
-                            validation_stats['files_validated'] += 1
-                        else:
-                            validation_stats['files_failed'] += 1
-                            validation_stats['errors'].append({
-                                'file_id': media_file.id,
-                                'error': result.get('error', 'Unknown error')
-                            })
-                            
-                    except Exception as e:
-                        error_msg = f'Error validating file {media_file.id}: {str(e)}'
+            
+            validation_stats = {
+                'files_processed': len(pending_files),
+                'files_validated': 0,
+                'files_failed': 0,
+                'errors': []
+            }
+            
+            for media_file, result in self._validate_files(pending_files):
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    
+                    if result['success']:
+                        validation_stats['files_validated'] += 1
+                    else:
+                        validation_stats['files_failed'] += 1
                         validation_stats['errors'].append({
                             'file_id': media_file.id,
-                            'error': error_msg
+                            'error': result.get('error', 'Unknown error')
                         })
-                        current_app.logger.error(error_msg)
+                        
+                except Exception as e:
+                    error_msg = f'Error validating file {media_file.id}: {str(e)}'
+                    validation_stats['errors'].append({
+                        'file_id': media_file.id,
+                        'error': error_msg
+                    })
+                    current_app.logger.error(error_msg)
+            
+            # Commit all changes
+            db.session.commit()
+            
+            current_app.logger.info(
+                f'Validation completed: {validation_stats["files_validated"]}/{validation_stats["files_processed"]} files validated'
+            )
+            
+            return {
+                'success': True,
+                **validation_stats
+            }
+            
+        except Exception as e:
+            db.session.rollback()
+            error_msg = f'Pending file validation failed: {str(e)}'
+            current_app.logger.error(error_msg)
+            return {
+                'success': False,
+                'error': error_msg
+            }
+    
+    def _validate_files(self, media_files, base_updates=None):
+        """
+        Validate files on a thread pool
+        
+        Checks run in worker threads; their database changes are applied
+        here on the calling thread because the session is not thread-safe,
+        as a few bulk statements rather than one UPDATE per file.
+        
+        Args:
+            media_files: List of loaded MediaFile instances
+            base_updates: Fields to set on every file before its own updates
+        
+        Returns:
+            list: (media_file, result) tuples, where result is the exception
+                if validation raised
+        """
+        app = current_app._get_current_object()
+        # Loop-invariant for the batch; looked up once, not per file
+        security_enabled = security_scanner.is_scanning_enabled()
+        # One timestamp for the whole batch's log rows
+        now = datetime.utcnow()
+        outcomes = []
+        log_rows = []
+        update_rows = []
+        validated_ids = []
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(media_files)))) as executor:
+            futures = {
+                executor.submit(self._validate_in_app_context, app, media_file, security_enabled): media_file
+                for media_file in media_files
+            }
+            
+            for future in as_completed(futures):
+                media_file = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if base_updates:
+                        update_rows.append({'id': media_file.id, **base_updates})
+                    outcomes.append((media_file, e))
+                    continue
                 
-                # Commit all changes
-                db.session.commit()
+                updates = {**(base_updates or {}), **result['updates']}
+                if updates:
+                    update_rows.append({'id': media_file.id, **updates})
                 
-                current_app.logger.info(
-                    f'Validation completed: {validation_stats["files_validated"]}/{validation_stats["files_processed"]} files validated'
-                )
+                if result['success']:
+                    validated_ids.append(media_file.id)
                 
-                return {
-                    'success': True,
-                    **validation_stats
-                }
+                if result['log']:
+                    log_rows.append({**result['log'], 'validated_at': now})
                 
-            except Exception as e:
-                db.session.rollback()
-                error_msg = f'Pending file validation failed: {str(e)}'
-                current_app.logger.error(error_msg)
-                return {
-                    'success': False,
-                    'error': error_msg
-                }
+                outcomes.append((media_file, result))
+        
+        # Per-file fields (stat fingerprint, error message) in one executemany
+        if update_rows:
+            db.session.bulk_update_mappings(MediaFile, update_rows)
+        
+        # Status shared by every validated file in a single UPDATE
+        if validated_ids:
+            MediaFile.query.filter(MediaFile.id.in_(validated_ids)).update({
+                'is_validated': True,
+                'validation_error': None
+            }, synchronize_session=False)
+        
+        # One multi-row INSERT for the whole batch
+        if log_rows:
+            db.session.bulk_insert_mappings(FileValidationLog, log_rows)
+        
+        return outcomes
     
-    def _validate_single_file(self, media_file):
+    def _validate_in_app_context(self, app, media_file, security_enabled):
+        """Worker entry point: validators read config and log through current_app"""
+        with app.app_context():
+            return self._validate_single_file(media_file, security_enabled=security_enabled)
+    
+    def _validate_single_file(self, media_file, security_enabled=None):
         """
         Validate a single media file
         
+        Safe to run off the request thread: the session is not touched and
+        the intended changes are returned instead.
+        
         Args:
             media_file: MediaFile instance
+            security_enabled: Whether to run the security scan; looked up
+                from config when not given
         
         Returns:
-            dict: Validation result
+            dict: Validation result, with 'updates' (per-file MediaFile fields to set)
+                and 'log' (FileValidationLog row, or None)
         """
         result = {
             'success': False,
             'error': None,
-            'validation_details': {}
+            'validation_details': {},
+            'updates': {},
+            'log': None
         }
         
+        if security_enabled is None:
+            security_enabled = security_scanner.is_scanning_enabled()
+        
         try:
-            # Check if file exists on disk
-            if not os.path.exists(media_file.file_path):
+            # open() doubles as the existence check and fstat avoids a second
+            # path lookup. The file stays open and is streamed by each check
+            # rather than read into memory - videos can be hundreds of MB
+            try:
+                f = open(media_file.file_path, 'rb')
+            except FileNotFoundError:
                 result['error'] = 'File not found on disk'
                 
                 # Log validation failure
-                validation_log = FileValidationLog.create_log(
-                    media_file.id,
-                    'file_existence',
-                    False,
-                    error_message=result['error']
-                )
-                db.session.add(validation_log)
+                result['log'] = {
+                    'media_file_id': media_file.id,
+                    'validation_type': 'file_existence',
+                    'validation_result': False,
+                    'error_message': result['error']
+                }
                 
                 return result
             
-            # Validate file integrity
-            integrity_result = self._validate_file_integrity(media_file)
-            result['validation_details']['integrity'] = integrity_result
-            
-            if not integrity_result['valid']:
-                result['error'] = 'File integrity validation failed'
-                return result
-            
-            # Validate file content
-            content_result = self._validate_file_content(media_file)
-            result['validation_details']['content'] = content_result
-            
-            if not content_result['valid']:
-                result['error'] = 'File content validation failed'
-                return result
-            
-            # Security validation if enabled
-            if security_scanner.is_scanning_enabled():
-                security_result = self._validate_file_security(media_file)
-                result['validation_details']['security'] = security_result
+            with f:
+                file_stat = os.fstat(f.fileno())
                 
-                if not security_result['valid']:
-                    result['error'] = 'File security validation failed'
+                # Validate file integrity
+                integrity_result = self._validate_file_integrity(media_file, f, file_stat)
+                result['validation_details']['integrity'] = integrity_result
+                
+                if not integrity_result['valid']:
+                    result['error'] = 'File integrity validation failed'
+                    return result
+                
+                # Remember the verified stat so later runs can skip re-hashing
+                result['updates'].update({
+                    'file_mtime_ns': file_stat.st_mtime_ns,
+                    'file_size_validated': file_stat.st_size
+                })
+                
+                # Validate file content
+                f.seek(0)
+                content_result = self._validate_file_content(media_file, f)
+                result['validation_details']['content'] = content_result
+                
+                if not content_result['valid']:
+                    result['error'] = 'File content validation failed'
                     return result
+                
+                # Security validation if enabled
+                if security_enabled:
+                    f.seek(0)
+                    security_result = self._validate_file_security(media_file, f)
+                    result['validation_details']['security'] = security_result
+                    
+                    if not security_result['valid']:
+                        result['error'] = 'File security validation failed'
+                        return result
             
-            # Update file validation status
-            media_file.is_validated = True
-            media_file.validation_error = None
+            # is_validated is set in bulk by the caller for successful files
             
             # Create successful validation log
-            validation_log = FileValidationLog.create_log(
-                media_file.id,
-                'complete_validation',
-                True,
-                details=result['validation_details']
-            )
-            db.session.add(validation_log)
+            result['log'] = {
+                'media_file_id': media_file.id,
+                'validation_type': 'complete_validation',
+                'validation_result': True,
+                'validation_details': result['validation_details']
+            }
             
             result['success'] = True
             current_app.logger.debug(f'File {media_file.id} validated successfully')
@@ -174,31 +313,37 @@ class ValidationTasks:
             result['error'] = str(e)
             
             # Update file with validation error
-            media_file.validation_error = result['error']
+            result['updates']['validation_error'] = result['error']
             
             # Log validation failure
-            validation_log = FileValidationLog.create_log(
-                media_file.id,
-                'validation_error',
-                False,
-                error_message=result['error']
-            )
-            db.session.add(validation_log)
+            result['log'] = {
+                'media_file_id': media_file.id,
+                'validation_type': 'validation_error',
+                'validation_result': False,
+                'error_message': result['error']
+            }
             
             current_app.logger.error(f'Exception during file validation {media_file.id}: {e}')
         
         return result
     
-    def _validate_file_integrity(self, media_file):
+    def _validate_file_integrity(self, media_file, file_obj, file_stat):
         """Validate file integrity using hash comparison"""
         result = {
             'valid': False,
             'error': None
         }
         
+        # Unchanged since the hash was last verified - it cannot differ now
+        if (media_file.file_mtime_ns == file_stat.st_mtime_ns and
+                media_file.file_size_validated == file_stat.st_size):
+            result['valid'] = True
+            result['cached'] = True
+            return result
+        
         try:
             # Calculate current file hash
-            current_hash = file_hasher.calculate_hash(media_file.file_path)
+            current_hash = file_hasher.calculate_hash(file_obj)
             
             # Compare with stored hash
             if current_hash == media_file.file_hash:
@@ -211,8 +356,8 @@ class ValidationTasks:
         
         return result
     
-    def _validate_file_content(self, media_file):
-        """Validate file content based on file type"""
+    def _validate_file_content(self, media_file, file_obj):
+        """Validate file content based on file type, parsing headers from the open file"""
         result = {
             'valid': False,
             'error': None,
@@ -222,9 +367,7 @@ class ValidationTasks:
         try:
             if media_file.file_type == 'image':
                 # Validate image content
-                validation_result = image_processor.validate_image_content(
-                    open(media_file.file_path, 'rb').read()
-                )
+                validation_result = image_processor.validate_image_content(file_obj)
                 
                 if validation_result['valid']:
                     result['valid'] = True
@@ -237,10 +380,8 @@ class ValidationTasks:
                     result['error'] = validation_result.get('error', 'Image validation failed')
                     
             elif media_file.file_type == 'video':
-                # Validate video content
-                validation_result = video_processor.validate_video_content(
-                    open(media_file.file_path, 'rb').read()
-                )
+                # Validate video content; ffprobe opens the path itself
+                validation_result = video_processor.validate_video_content(media_file.file_path)
                 
                 if validation_result['valid']:
                     result['valid'] = True
@@ -260,8 +401,16 @@ class ValidationTasks:
         
         return result
     
-    def _validate_file_security(self, media_file):
-        """Validate file security"""
+    def _validate_file_security(self, media_file, file_obj):
+        """
+        Validate file security
+        
+        Args:
+            media_file: MediaFile instance
+            file_obj: The file opened in binary mode, positioned at the start.
+                Read here only for in-process scans; a scan worker reads
+                media_file.file_path itself rather than receiving the bytes
+        """
         result = {
             'valid': False,
             'error': None,
@@ -269,16 +418,22 @@ class ValidationTasks:
         }
         
         try:
-            # Read file content
-            with open(media_file.file_path, 'rb') as f:
-                file_content = f.read()
-            
-            # Perform security scan
-            security_result = security_scanner.scan_file(
-                file_content,
-                media_file.original_filename,
-                media_file.mime_type
-            )
+            # Perform security scan, off the GIL when a process pool is configured
+            scan_pool = self._get_scan_pool()
+            
+            if scan_pool is None:
+                security_result = security_scanner.scan_file(
+                    file_obj.read(),
+                    media_file.original_filename,
+                    media_file.mime_type
+                )
+            else:
+                security_result = scan_pool.submit(
+                    _scan_in_subprocess,
+                    media_file.file_path,
+                    media_file.original_filename,
+                    media_file.mime_type
+                ).result(timeout=self.validation_timeout)
             
             if security_result['safe']:
                 result['valid'] = True
@@ -286,6 +441,11 @@ class ValidationTasks:
                 result['error'] = 'Security threats detected'
                 result['threats'] = security_result['threats_detected']
                 
+        except BrokenProcessPool as e:
+            # A scan worker died; start a fresh pool on the next scan
+            with self._scan_pool_lock:
+                self._scan_pool = None
+            result['error'] = f'Security validation failed: {str(e)}'
         except Exception as e:
             result['error'] = f'Security validation failed: {str(e)}'
         
@@ -298,74 +458,83 @@ class ValidationTasks:
         This task gives failed files another chance at validation,
         which might succeed if the failure was temporary.
         """
-        with current_app.app_context():
-            try:
-                current_app.logger.info('Starting revalidation of failed files')
-                
-                # Find files with validation errors
-                failed_files = MediaFile.query.filter(
-                    and_(
-                        MediaFile.is_validated == False,
-                        MediaFile.validation_error.isnot(None),
-                        MediaFile.is_active == True
-                    )
-                ).limit(self.batch_size // 2).all()  # Smaller batch for revalidation
-                
-                if not failed_files:
-                    return {
-                        'success': True,
-                        'files_processed': 0,
-                        'files_revalidated': 0,
-                        'message': 'No failed files to revalidate'
-                    }
-                
-                revalidation_stats = {
-                    'files_processed': len(failed_files),
-                    'files_revalidated': 0,
-                    'still_failed': 0,
-                    'errors': []
-                }
-                
-                for media_file in failed_files:
-                    try:
-                        # Clear previous validation error
-                        media_file.validation_error = None
-                        
-                        # Attempt revalidation
-                        result = self._validate_single_file(media_file)
-                        
-                        if result['success']:
-                            revalidation_stats['files_revalidated'] += 1
-                        else:
-                            revalidation_stats['still_failed'] += 1
-                            
-                    except Exception as e:
-                        error_msg = f'Error revalidating file {media_file.id}: {str(e)}'
-                        revalidation_stats['errors'].append({
-                            'file_id': media_file.id,
-                            'error': error_msg
-                        })
-                        current_app.logger.error(error_msg)
-                
-                db.session.commit()
-                
-                current_app.logger.info(
-                    f'Revalidation completed: {revalidation_stats["files_revalidated"]}/{revalidation_stats["files_processed"]} files revalidated'
+        try:
+            current_app.logger.info('Starting revalidation of failed files')
+            
+            revalidation_limit = self.batch_size // 2  # Smaller batch for revalidation
+            
+            # Find files with validation errors, continuing after the last
+            # file seen so persistent failures don't starve the rest. These
+            # rows also match the pending query; SKIP LOCKED makes whichever
+            # job gets there second pass over them instead of waiting
+            failed_files = MediaFile.query.filter(
+                and_(
+                    MediaFile.is_validated == False,
+                    MediaFile.validation_error.isnot(None),
+                    MediaFile.is_active == True,
+                    MediaFile.id > self._revalidation_cursor
                 )
-                
+            ).order_by(MediaFile.id).limit(revalidation_limit).with_for_update(skip_locked=True).all()
+            
+            # Wrap around once the end of the failed files is reached
+            if len(failed_files) < revalidation_limit:
+                self._revalidation_cursor = 0
+            else:
+                self._revalidation_cursor = failed_files[-1].id
+            
+            if not failed_files:
                 return {
                     'success': True,
-                    **revalidation_stats
-                }
-                
-            except Exception as e:
-                db.session.rollback()
-                error_msg = f'File revalidation failed: {str(e)}'
-                current_app.logger.error(error_msg)
-                return {
-                    'success': False,
-                    'error': error_msg
+                    'files_processed': 0,
+                    'files_revalidated': 0,
+                    'message': 'No failed files to revalidate'
                 }
+            
+            revalidation_stats = {
+                'files_processed': len(failed_files),
+                'files_revalidated': 0,
+                'still_failed': 0,
+                'errors': []
+            }
+            
+            # Attempt revalidation, clearing previous validation errors
+            for media_file, result in self._validate_files(failed_files, base_updates={'validation_error': None}):
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    
+                    if result['success']:
+                        revalidation_stats['files_revalidated'] += 1
+                    else:
+                        revalidation_stats['still_failed'] += 1
+                        
+                except Exception as e:
+                    error_msg = f'Error revalidating file {media_file.id}: {str(e)}'
+                    revalidation_stats['errors'].append({
+                        'file_id': media_file.id,
+                        'error': error_msg
+                    })
+                    current_app.logger.error(error_msg)
+            
+            db.session.commit()
+            
+            current_app.logger.info(
+                f'Revalidation completed: {revalidation_stats["files_revalidated"]}/{revalidation_stats["files_processed"]} files revalidated'
+            )
+            
+            return {
+                'success': True,
+                **revalidation_stats
+            }
+            
+        except Exception as e:
+            db.session.rollback()
+            error_msg = f'File revalidation failed: {str(e)}'
+            current_app.logger.error(error_msg)
+            return {
+                'success': False,
+                'error': error_msg
+            }
     
     def get_validation_statistics(self):
         """
@@ -374,45 +543,50 @@ class ValidationTasks:
         Returns:
             dict: Validation statistics
         """
-        with current_app.app_context():
-            try:
-                stats = {
-                    'validated_files': MediaFile.query.filter_by(is_validated=True).count(),
-                    'pending_validation': MediaFile.query.filter_by(is_validated=False).count(),
-                    'failed_validation': MediaFile.query.filter(
-                        and_(
-                            MediaFile.is_validated == False,
-                            MediaFile.validation_error.isnot(None)
-                        )
-                    ).count(),
-                    'total_files': MediaFile.query.count()
-                }
-                
-                # Get recent validation logs
-                recent_validations = FileValidationLog.query.filter(
-                    FileValidationLog.validated_at >= datetime.utcnow() - timedelta(days=7)
-                ).count()
-                
-                stats['recent_validations'] = recent_validations
-                
-                # Get validation success rate
-                if stats['total_files'] > 0:
-                    stats['validation_success_rate'] = (stats['validated_files'] / stats['total_files']) * 100
-                else:
-                    stats['validation_success_rate'] = 0
-                
-                return {
-                    'success': True,
-                    'statistics': stats
-                }
-                
-            except Exception as e:
-                error_msg = f'Failed to get validation statistics: {str(e)}'
-                current_app.logger.error(error_msg)
-                return {
-                    'success': False,
-                    'error': error_msg
-                }
+        try:
+            count = db.func.count(MediaFile.id)
+            
+            # Recent validation log count, evaluated in the same statement
+            recent_validations = db.session.query(
+                db.func.count(FileValidationLog.id)
+            ).filter(
+                FileValidationLog.validated_at >= datetime.utcnow() - timedelta(days=7)
+            ).scalar_subquery()
+            
+            # One round-trip using conditional aggregation
+            row = db.session.query(
+                count.filter(MediaFile.is_validated == True).label('validated_files'),
+                count.filter(MediaFile.is_validated == False).label('pending_validation'),
+                count.filter(
+                    and_(
+                        MediaFile.is_validated == False,
+                        MediaFile.validation_error.isnot(None)
+                    )
+                ).label('failed_validation'),
+                count.label('total_files'),
+                recent_validations.label('recent_validations')
+            ).one()
+            
+            stats = dict(row._mapping)
+            
+            # Get validation success rate
+            if stats['total_files'] > 0:
+                stats['validation_success_rate'] = (stats['validated_files'] / stats['total_files']) * 100
+            else:
+                stats['validation_success_rate'] = 0
+            
+            return {
+                'success': True,
+                'statistics': stats
+            }
+            
+        except Exception as e:
+            error_msg = f'Failed to get validation statistics: {str(e)}'
+            current_app.logger.error(error_msg)
+            return {
+                'success': False,
+                'error': error_msg
+            }
 
 # Global validation tasks instance
 validation_tasks = ValidationTasks()
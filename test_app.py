@@ -1,15 +1,25 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, jsonify, request, send_file, make_response, g
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
+import math
 import hashlib
-import magic
+import tempfile
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PIL import Image
 from dotenv import load_dotenv
 from functools import wraps
 
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -17,20 +27,75 @@ app = Flask(__name__)
 # Configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///test.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # Sized for the gthread workers: one pooled connection per thread plus
+    # headroom; LIFO reuse keeps a warm core and lets idle extras expire
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+        'pool_use_lifo': True
+    }
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 52428800))  # 50MB
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', '/tmp/uploads')
+# Compress JSON responses only; downloads are already-compressed media
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_LEVEL'] = 4
+app.config['COMPRESS_MIN_SIZE'] = 512
+if Compress:
+    Compress(app)
+
+# Let the front server send file bodies: set X_ACCEL_REDIRECT_PREFIX to an
+# nginx internal location aliased to UPLOAD_FOLDER, or USE_X_SENDFILE=true
+# behind Apache/lighttpd; otherwise files are streamed by the app
+app.config['X_ACCEL_REDIRECT_PREFIX'] = os.getenv('X_ACCEL_REDIRECT_PREFIX', '')
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'
 
 # Service Configuration
 AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'https://web-production-ddd7e.up.railway.app')
 SERVICE_TOKEN = os.getenv('SERVICE_TOKEN', 'ch4nn3l_s3rv1c3_t0k3n_2025_s3cur3_r4nd0m_str1ng')
 SERVICE_TOKEN_HEADER = os.getenv('SERVICE_TOKEN_HEADER', 'X-Service-Token')
 
+# Shared session so auth-service calls reuse pooled keep-alive connections
+# instead of a new TCP+TLS handshake per request
+AUTH_SESSION = requests.Session()
+AUTH_SESSION.headers[SERVICE_TOKEN_HEADER] = SERVICE_TOKEN
+_auth_adapter = HTTPAdapter(
+    pool_connections=50,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.2)
+)
+AUTH_SESSION.mount('https://', _auth_adapter)
+AUTH_SESSION.mount('http://', _auth_adapter)
+
+# Successful token verifications are cached briefly so a client's burst of
+# requests costs one auth-service round-trip; 0 disables the cache
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 30))  # seconds
+AUTH_CACHE_MAX_SIZE = 10000
+_auth_cache = {}  # token digest -> (expires_at, auth_data), oldest first
+_auth_cache_lock = threading.Lock()
+
+# File metadata served by the GET endpoints, cached briefly for clients that
+# poll the same file; per process, so a delete in another worker can take
+# up to the TTL to show. 0 disables the cache
+FILE_CACHE_TTL = int(os.getenv('FILE_CACHE_TTL', 10))  # seconds
+FILE_CACHE_MAX_SIZE = 50000
+_file_cache = {}  # file id -> (expires_at, file dict), oldest first
+_file_cache_lock = threading.Lock()
+
 # Allowed file types
 ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi'}
 ALLOWED_EXTENSIONS = ALLOWED_IMAGE_EXTENSIONS | ALLOWED_VIDEO_EXTENSIONS
 
+# SHA-256 is only hardware-accelerated (SHA-NI / ARMv8 crypto) through
+# OpenSSL, which dispatches on CPU features at runtime; the builtin
+# fallback is scalar
+if not hashlib.sha256.__name__.startswith('openssl_'):
+    app.logger.warning("hashlib is not OpenSSL-backed; file hashing will be slow")
+
 # Create upload directory
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -52,6 +117,17 @@ class MediaFile(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Every user-facing lookup filters on account and active flag, by id or
+    # newest-first by id
+    __table_args__ = (
+        db.Index('ix_mediafile_account_active_id', 'account_id', 'is_active', 'id'),
+        # Upload deduplication lookup
+        db.Index(
+            'ix_mediafile_account_hash_active', 'account_id', 'file_hash',
+            postgresql_where=db.text('is_active')
+        ),
+    )
 
     def to_dict(self):
         return {
@@ -67,19 +143,104 @@ class MediaFile(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+# Columns emitted by MediaFile.to_dict, for listings built from plain rows
+MEDIA_FILE_LIST_COLUMNS = (
+    MediaFile.id,
+    MediaFile.account_id,
+    MediaFile.original_filename,
+    MediaFile.file_size,
+    MediaFile.file_type,
+    MediaFile.mime_type,
+    MediaFile.file_hash,
+    MediaFile.is_active,
+    MediaFile.created_at,
+    MediaFile.updated_at
+)
+
+def media_file_row_to_dict(row):
+    """Same output as MediaFile.to_dict, from a MEDIA_FILE_LIST_COLUMNS row"""
+    data = row._asdict()
+    data['created_at'] = row.created_at.isoformat() if row.created_at else None
+    data['updated_at'] = row.updated_at.isoformat() if row.updated_at else None
+    return data
+
+# Per-request file lookups, built once and executed with bound parameters
+GET_ACTIVE_FILE_STMT = db.select(MediaFile).where(
+    MediaFile.id == db.bindparam('file_id'),
+    MediaFile.is_active == True
+)
+GET_USER_FILE_STMT = GET_ACTIVE_FILE_STMT.where(
+    MediaFile.account_id == db.bindparam('account_id')
+)
+
+def get_active_file(file_id):
+    """Active file by id, or None"""
+    return db.session.execute(
+        GET_ACTIVE_FILE_STMT, {'file_id': file_id}
+    ).scalar_one_or_none()
+
+def get_user_file(file_id, account_id):
+    """Active file by id owned by the account, or None"""
+    return db.session.execute(
+        GET_USER_FILE_STMT, {'file_id': file_id, 'account_id': account_id}
+    ).scalar_one_or_none()
+
+def get_active_file_dict(file_id):
+    """to_dict() of an active file by id, or None, from the file cache when fresh"""
+    with _file_cache_lock:
+        cached = _file_cache.get(file_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+    
+    media_file = get_active_file(file_id)
+    if not media_file:
+        return None
+    
+    file_dict = media_file.to_dict()
+    if FILE_CACHE_TTL > 0:
+        with _file_cache_lock:
+            _file_cache.pop(file_id, None)
+            if len(_file_cache) >= FILE_CACHE_MAX_SIZE:
+                del _file_cache[next(iter(_file_cache))]
+            _file_cache[file_id] = (time.monotonic() + FILE_CACHE_TTL, file_dict)
+    return file_dict
+
+def invalidate_file_cache(file_id):
+    """Drop a file's cached metadata after it changes"""
+    with _file_cache_lock:
+        _file_cache.pop(file_id, None)
+
 def verify_auth_token(token):
     """Verify authentication token with Auth Service"""
+    # Key on a digest so raw bearer tokens aren't kept in memory
+    cache_key = hashlib.sha256(token.encode()).digest()[:16]
+    
+    with _auth_cache_lock:
+        cached = _auth_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+    
     try:
-        headers = {SERVICE_TOKEN_HEADER: SERVICE_TOKEN}
-        response = requests.post(
+        response = AUTH_SESSION.post(
             f"{AUTH_SERVICE_URL}/api/auth/verify",
             json={"token": token},
-            headers=headers,
             timeout=5
         )
         
         if response.status_code == 200:
-            return response.json()
+            auth_data = response.json()
+            if auth_data.get('valid') and AUTH_CACHE_TTL > 0:
+                with _auth_cache_lock:
+                    _auth_cache.pop(cache_key, None)
+                    # Entries share one TTL, so the first is the oldest
+                    if len(_auth_cache) >= AUTH_CACHE_MAX_SIZE:
+                        del _auth_cache[next(iter(_auth_cache))]
+                    _auth_cache[cache_key] = (time.monotonic() + AUTH_CACHE_TTL, auth_data)
+            return auth_data
+        
+        # Rejected token - forget any stale cached verification
+        with _auth_cache_lock:
+            _auth_cache.pop(cache_key, None)
         return None
         
     except Exception as e:
@@ -123,11 +284,88 @@ def allowed_file(filename):
 
 def get_file_hash(file_path):
     """Calculate SHA256 hash of file"""
-    hash_sha256 = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_sha256.update(chunk)
-    return hash_sha256.hexdigest()
+        # file_digest runs the read/update loop in C (Python 3.11+)
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        
+        hash_sha256 = hashlib.sha256()
+        buf = bytearray(1 << 20)
+        mv = memoryview(buf)
+        while n := f.readinto(buf):
+            hash_sha256.update(mv[:n])
+        return hash_sha256.hexdigest()
+
+def save_upload(file, file_path):
+    """Write an upload to disk in one pass, hashing it and keeping its head for MIME sniffing
+    
+    Returns (file_size, sha256 hex digest, first 2KB of the file)
+    """
+    hash_sha256 = hashlib.sha256()
+    buf = bytearray(1 << 20)
+    mv = memoryview(buf)
+    file_size = 0
+    head = b''
+    
+    with open(file_path, "wb") as out:
+        while n := file.stream.readinto(buf):
+            if not file_size:
+                head = bytes(mv[:min(n, 2048)])
+            hash_sha256.update(mv[:n])
+            out.write(mv[:n])
+            file_size += n
+    
+    return file_size, hash_sha256.hexdigest(), head
+
+# Magic-byte signatures for the allowed formats: (offset, prefix, MIME type)
+MIME_SIGNATURES = (
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (4, b'ftypqt  ', 'video/quicktime'),
+    (4, b'ftyp', 'video/mp4'),
+    (4, b'moov', 'video/quicktime'),
+    (4, b'mdat', 'video/quicktime'),
+    (4, b'wide', 'video/quicktime'),
+)
+
+def sniff_mime(head):
+    """Detect the MIME type of an allowed image/video from its first bytes"""
+    for offset, prefix, mime_type in MIME_SIGNATURES:
+        if head.startswith(prefix, offset):
+            return mime_type
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'video/x-msvideo'
+    return 'application/octet-stream'
+
+def send_media_file(media_file):
+    """Send a stored file as an attachment, delegating the body to nginx when configured"""
+    accel_prefix = app.config['X_ACCEL_REDIRECT_PREFIX']
+    if not accel_prefix:
+        return send_file(
+            media_file.file_path,
+            as_attachment=True,
+            download_name=media_file.original_filename,
+            mimetype=media_file.mime_type
+        )
+    
+    relative_path = os.path.relpath(media_file.file_path, app.config['UPLOAD_FOLDER'])
+    response = make_response('')
+    response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{relative_path}"
+    response.headers['Content-Type'] = media_file.mime_type
+    response.headers.set('Content-Disposition', 'attachment', filename=media_file.original_filename)
+    return response
+
+def content_path(file_hash, file_id):
+    """Storage path for a file row: fanned out by its SHA-256, unique to the row
+    
+    Rows never share a file, so deleting one row's file (including by the
+    main app's cleanup tasks) can't remove bytes another row still serves.
+    """
+    return os.path.join(
+        app.config['UPLOAD_FOLDER'], file_hash[:2], file_hash[2:4], f"{file_hash}_{file_id}"
+    )
 
 def get_file_type(filename):
     """Determine if file is image or video"""
@@ -138,6 +376,12 @@ def get_file_type(filename):
         return 'video'
     return 'unknown'
 
+@app.before_request
+def set_request_time():
+    """Take the request's timestamp once for every response field that reports it"""
+    g.now = datetime.utcnow()
+    g.now_iso = g.now.isoformat()
+
 @app.route('/')
 def root():
     return jsonify({
@@ -169,37 +413,73 @@ def health():
         'version': '1.0.0'
     })
 
-@app.route('/health/detailed')
-def detailed_health():
+# Health probe results, each reused until its own TTL expires so frequent
+# health polling doesn't hit the database and auth service every time
+_probe_cache = {}  # key -> (expires_at, result)
+_probe_cache_lock = threading.Lock()
+
+def _probed(key, ttl, fn):
+    """Return fn()'s cached result for key, re-running it once ttl seconds have passed"""
+    with _probe_cache_lock:
+        cached = _probe_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+    
+    result = fn()
+    with _probe_cache_lock:
+        _probe_cache[key] = (time.monotonic() + ttl, result)
+    return result
+
+def _probe_database():
     try:
-        # Test database connection
         db.session.execute(db.text('SELECT 1'))
-        db_status = {'connected': True}
-        
-        # Get file count
-        try:
-            file_count = MediaFile.query.count()
-            db_status['total_files'] = file_count
-        except Exception:
-            db_status['total_files'] = 'unknown'
-            
+        return {'connected': True}
     except Exception as e:
-        db_status = {'connected': False, 'error': str(e)}
-    
-    # Check upload folder
-    upload_status = {
+        db.session.rollback()
+        return {'connected': False, 'error': str(e)}
+
+def _probe_file_count():
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            # Planner estimate from the catalog - no table scan; -1 until
+            # the table has been analyzed
+            estimate = db.session.execute(db.text(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = 'media_files'"
+            )).scalar()
+            if estimate is not None and estimate >= 0:
+                return estimate
+        return MediaFile.query.count()
+    except Exception:
+        db.session.rollback()
+        return 'unknown'
+
+def _probe_storage():
+    return {
         'available': os.path.exists(app.config['UPLOAD_FOLDER']),
         'path': app.config['UPLOAD_FOLDER']
     }
-    
-    # Test auth service connection
-    auth_status = {'connected': False}
+
+def _probe_auth_service():
     try:
-        headers = {SERVICE_TOKEN_HEADER: SERVICE_TOKEN}
-        response = requests.get(f"{AUTH_SERVICE_URL}/health", headers=headers, timeout=5)
-        auth_status = {'connected': response.status_code == 200, 'url': AUTH_SERVICE_URL}
+        response = AUTH_SESSION.get(f"{AUTH_SERVICE_URL}/health", timeout=5)
+        return {'connected': response.status_code == 200, 'url': AUTH_SERVICE_URL}
     except Exception as e:
-        auth_status = {'connected': False, 'error': str(e), 'url': AUTH_SERVICE_URL}
+        return {'connected': False, 'error': str(e), 'url': AUTH_SERVICE_URL}
+
+@app.route('/health/detailed')
+def detailed_health():
+    # Test database connection
+    db_status = dict(_probed('database', 5, _probe_database))
+    
+    # Get file count (approximate on PostgreSQL)
+    if db_status['connected']:
+        db_status['total_files'] = _probed('file_count', 60, _probe_file_count)
+    
+    # Check upload folder
+    upload_status = _probed('storage', 30, _probe_storage)
+    
+    # Test auth service connection
+    auth_status = _probed('auth_service', 15, _probe_auth_service)
     
     return jsonify({
         'status': 'healthy' if db_status.get('connected') else 'unhealthy',
@@ -208,7 +488,7 @@ def detailed_health():
         'database': db_status,
         'storage': upload_status,
         'auth_service': auth_status,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': g.now_iso
     })
 
 @app.route('/api/test')
@@ -216,7 +496,7 @@ def api_test():
     return jsonify({
         'success': True,
         'message': 'API is working',
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': g.now_iso
     })
 
 @app.route('/api/db/init', methods=['POST'])
@@ -224,10 +504,15 @@ def api_test():
 def init_database():
     try:
         db.create_all()
+        
+        # create_all skips indexes on tables that already exist
+        for index in MediaFile.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        
         return jsonify({
             'success': True,
             'message': 'Database initialized successfully',
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now_iso
         })
     except Exception as e:
         return jsonify({
@@ -254,7 +539,7 @@ def database_status():
             'connected': True,
             'tables': tables_info,
             'database_url': app.config['SQLALCHEMY_DATABASE_URI'].split('@')[1] if '@' in app.config['SQLALCHEMY_DATABASE_URI'] else 'local',
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now_iso
         })
         
     except Exception as e:
@@ -262,7 +547,7 @@ def database_status():
             'success': False,
             'connected': False,
             'error': str(e),
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now_iso
         }), 500
 
 @app.route('/api/upload', methods=['POST'])
@@ -292,44 +577,72 @@ def upload_file():
         if not filename:
             return jsonify({'success': False, 'error': 'Invalid filename'}), 400
         
-        # Create unique filename with timestamp
-        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        # Save file
-        file.save(file_path)
+        # Save to a temporary file in the upload folder, hashing it on the
+        # way to disk instead of re-reading it
+        fd, tmp_path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.part')
+        os.close(fd)
         
-        # Get file info
-        file_size = os.path.getsize(file_path)
-        file_hash = get_file_hash(file_path)
-        file_type = get_file_type(filename)
-        
-        # Get MIME type
         try:
-            mime_type = magic.from_file(file_path, mime=True)
-        except:
-            mime_type = 'application/octet-stream'
-        
-        # Save to database
-        media_file = MediaFile(
-            account_id=account_id,
-            original_filename=filename,
-            file_path=file_path,
-            file_size=file_size,
-            file_type=file_type,
-            mime_type=mime_type,
-            file_hash=file_hash
-        )
-        
-        db.session.add(media_file)
-        db.session.commit()
+            file_size, file_hash, head = save_upload(file, tmp_path)
+            
+            # Same bytes already stored for this account - keep the existing copy
+            existing_file = MediaFile.query.filter_by(
+                account_id=account_id,
+                file_hash=file_hash,
+                is_active=True
+            ).first()
+            
+            if existing_file:
+                return jsonify({
+                    'success': True,
+                    'message': 'File already uploaded',
+                    'duplicate': True,
+                    'file': existing_file.to_dict(),
+                    'timestamp': g.now_iso
+                }), 200
+            
+            file_type = get_file_type(filename)
+            
+            # Get MIME type from the bytes already read; the allowed formats
+            # are all identified by their first few bytes
+            mime_type = sniff_mime(head)
+            
+            # Save to database; flushing assigns the id the storage path needs
+            media_file = MediaFile(
+                account_id=account_id,
+                original_filename=filename,
+                file_path=tmp_path,
+                file_size=file_size,
+                file_type=file_type,
+                mime_type=mime_type,
+                file_hash=file_hash
+            )
+            
+            db.session.add(media_file)
+            db.session.flush()
+            
+            # Store under the hash, fanned out over two directory levels to
+            # keep directories small. Same filesystem, so this is a rename
+            # rather than a copy
+            media_file.file_path = content_path(file_hash, media_file.id)
+            os.makedirs(os.path.dirname(media_file.file_path), exist_ok=True)
+            os.replace(tmp_path, media_file.file_path)
+            
+            try:
+                db.session.commit()
+            except Exception:
+                # The row never landed, so nothing will ever point at this file
+                os.unlink(media_file.file_path)
+                raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
         
         return jsonify({
             'success': True,
             'message': 'File uploaded successfully',
             'file': media_file.to_dict(),
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now_iso
         }), 201
         
     except Exception as e:
@@ -346,33 +659,54 @@ def list_files():
     try:
         # Use account_id from authenticated user
         account_id = request.account_id
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 10, type=int), 100)
-        
-        # Build query for user's files only
-        query = MediaFile.query.filter_by(account_id=account_id, is_active=True)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = max(min(request.args.get('per_page', 10, type=int), 100), 1)
+        cursor = request.args.get('cursor', type=int)
+        
+        # Select just the listed columns for the user's files, newest first;
+        # rows become dicts directly, without building ORM instances
+        user_files = (MediaFile.account_id == account_id, MediaFile.is_active == True)
+        stmt = db.select(*MEDIA_FILE_LIST_COLUMNS).where(*user_files).order_by(MediaFile.id.desc())
+        
+        if cursor is not None:
+            # Keyset pagination: seek past the cursor on the index instead
+            # of an OFFSET scan plus a COUNT(*) per page
+            rows = db.session.execute(stmt.where(MediaFile.id < cursor).limit(per_page + 1)).all()
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            
+            return jsonify({
+                'success': True,
+                'files': [media_file_row_to_dict(row) for row in rows],
+                'pagination': {
+                    'per_page': per_page,
+                    'has_next': has_next,
+                    'next_cursor': rows[-1].id if has_next else None
+                },
+                'timestamp': g.now_iso
+            })
         
         # Paginate
-        pagination = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
-        
-        files = [file.to_dict() for file in pagination.items]
+        total = db.session.execute(
+            db.select(db.func.count()).select_from(MediaFile).where(*user_files)
+        ).scalar()
+        pages = math.ceil(total / per_page)
+        rows = db.session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
+        has_next = page < pages
         
         return jsonify({
             'success': True,
-            'files': files,
+            'files': [media_file_row_to_dict(row) for row in rows],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
+                'total': total,
+                'pages': pages,
+                'has_next': has_next,
+                'has_prev': page > 1,
+                'next_cursor': rows[-1].id if has_next and rows else None
             },
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now_iso
         })
         
     except Exception as e:
@@ -387,19 +721,15 @@ def list_files():
 def get_file(file_id):
     try:
         # Only allow access to user's own files
-        media_file = MediaFile.query.filter_by(
-            id=file_id, 
-            account_id=request.account_id, 
-            is_active=True
-        ).first()
+        file_dict = get_active_file_dict(file_id)
         
-        if not media_file:
+        if not file_dict or str(file_dict['account_id']) != str(request.account_id):
             return jsonify({'success': False, 'error': 'File not found'}), 404
         
         return jsonify({
             'success': True,
-            'file': media_file.to_dict(),
-            'timestamp': datetime.utcnow().isoformat()
+            'file': file_dict,
+            'timestamp': g.now_iso
         })
         
     except Exception as e:
@@ -414,24 +744,21 @@ def get_file(file_id):
 def delete_file(file_id):
     try:
         # Only allow deletion of user's own files
-        media_file = MediaFile.query.filter_by(
-            id=file_id, 
-            account_id=request.account_id, 
-            is_active=True
-        ).first()
+        media_file = get_user_file(file_id, request.account_id)
         
         if not media_file:
             return jsonify({'success': False, 'error': 'File not found'}), 404
         
         # Soft delete
         media_file.is_active = False
-        media_file.updated_at = datetime.utcnow()
+        media_file.updated_at = g.now
         db.session.commit()
+        invalidate_file_cache(file_id)
         
         return jsonify({
             'success': True,
             'message': 'File deleted successfully',
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now_iso
         })
         
     except Exception as e:
@@ -447,25 +774,16 @@ def delete_file(file_id):
 def download_file(file_id):
     try:
         # Only allow download of user's own files
-        media_file = MediaFile.query.filter_by(
-            id=file_id, 
-            account_id=request.account_id, 
-            is_active=True
-        ).first()
+        media_file = get_user_file(file_id, request.account_id)
         
         if not media_file:
             return jsonify({'success': False, 'error': 'File not found'}), 404
         
-        if not os.path.exists(media_file.file_path):
-            return jsonify({'success': False, 'error': 'File not found on disk'}), 404
-        
-        return send_file(
-            media_file.file_path,
-            as_attachment=True,
-            download_name=media_file.original_filename,
-            mimetype=media_file.mime_type
-        )
+        # send_file's own stat doubles as the existence check
+        return send_media_file(media_file)
         
+    except FileNotFoundError:
+        return jsonify({'success': False, 'error': 'File not found on disk'}), 404
     except Exception as e:
         return jsonify({
             'success': False,
@@ -479,11 +797,7 @@ def associate_file(file_id):
     """Associate a file with a giveaway (for service-to-service communication)"""
     try:
         # Only allow association of user's own files
-        media_file = MediaFile.query.filter_by(
-            id=file_id, 
-            account_id=request.account_id, 
-            is_active=True
-        ).first()
+        media_file = get_user_file(file_id, request.account_id)
         
         if not media_file:
             return jsonify({'success': False, 'error': 'File not found'}), 404
@@ -501,7 +815,7 @@ def associate_file(file_id):
             'file_id': file_id,
             'giveaway_id': giveaway_id,
             'file_url': f"/api/files/{file_id}/download",
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now_iso
         })
         
     except Exception as e:
@@ -517,16 +831,16 @@ def associate_file(file_id):
 def service_get_file(file_id):
     """Service-to-service endpoint to get file information"""
     try:
-        media_file = MediaFile.query.filter_by(id=file_id, is_active=True).first()
+        file_dict = get_active_file_dict(file_id)
         
-        if not media_file:
+        if not file_dict:
             return jsonify({'success': False, 'error': 'File not found'}), 404
         
         return jsonify({
             'success': True,
-            'file': media_file.to_dict(),
+            'file': file_dict,
             'download_url': f"/api/service/files/{file_id}/download",
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now_iso
         })
         
     except Exception as e:
@@ -541,21 +855,16 @@ def service_get_file(file_id):
 def service_download_file(file_id):
     """Service-to-service endpoint to download files"""
     try:
-        media_file = MediaFile.query.filter_by(id=file_id, is_active=True).first()
+        media_file = get_active_file(file_id)
         
         if not media_file:
             return jsonify({'success': False, 'error': 'File not found'}), 404
         
-        if not os.path.exists(media_file.file_path):
-            return jsonify({'success': False, 'error': 'File not found on disk'}), 404
-        
-        return send_file(
-            media_file.file_path,
-            as_attachment=True,
-            download_name=media_file.original_filename,
-            mimetype=media_file.mime_type
-        )
+        # send_file's own stat doubles as the existence check
+        return send_media_file(media_file)
         
+    except FileNotFoundError:
+        return jsonify({'success': False, 'error': 'File not found on disk'}), 404
     except Exception as e:
         return jsonify({
             'success': False,
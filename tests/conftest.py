@@ -1,11 +1,32 @@
+import copy
 import os
 import tempfile
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
+from sqlalchemy import event
+from sqlalchemy.orm import scoped_session, sessionmaker
 
 from app import create_app
 from models import db, MediaFile, FileValidationLog, FileCleanupLog
 
+def _enable_sqlite_savepoints(engine):
+    """Make pysqlite emit a real BEGIN (SQLAlchemy's documented recipe)
+    
+    pysqlite sends no BEGIN for connection.begin(), so db_session's
+    SAVEPOINT would be the outermost transaction and releasing it would
+    commit for real.
+    """
+    # Connections opened before the listeners were added lack the hook
+    engine.dispose()
+    
+    @event.listens_for(engine, 'connect')
+    def disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine, 'begin')
+    def emit_begin(conn):
+        conn.exec_driver_sql('BEGIN')
+
 @pytest.fixture(scope='session')
 def app():
     """Create application for testing"""
@@ -16,9 +37,8 @@ def app():
     # Create temporary upload directory
     upload_dir = tempfile.mkdtemp()
     
-    app = create_app('testing')
-    app.config.update({
-        'DATABASE_URL': f'sqlite:///{db_path}',
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
         'UPLOAD_FOLDER': upload_dir,
         'TESTING': True,
         'WTF_CSRF_ENABLED': False,
@@ -30,29 +50,56 @@ def app():
     })
     
     with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            _enable_sqlite_savepoints(db.engine)
+        
         db.create_all()
         yield app
+        
+        # The context stays pushed for the whole run, so the app's session
+        # is never removed by teardown and may still hold a transaction
+        db.session.remove()
         db.drop_all()
     
     os.close(db_fd)
     os.unlink(db_path)
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def client(app):
-    """Create test client"""
+    """Create test client, shared by every test like the app itself"""
+    # Requests authenticate with headers, not cookies, so nothing carries
+    # over between tests through the client
     return app.test_client()
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def runner(app):
     """Create test CLI runner"""
     return app.test_cli_runner()
 
 @pytest.fixture
 def db_session(app):
-    """Create database session for testing"""
-    with app.app_context():
-        yield db.session
-        db.session.rollback()
+    """Database session whose changes are rolled back after each test
+    
+    Tables are created once for the session by the app fixture. Each test
+    runs inside an outer transaction on one connection; commits made by
+    the test or the code under test only release a SAVEPOINT, and the
+    outer transaction is rolled back in teardown.
+    """
+    connection = db.engine.connect()
+    transaction = connection.begin()
+    
+    app_session = db.session
+    db.session = scoped_session(sessionmaker(
+        bind=connection,
+        join_transaction_mode='create_savepoint'
+    ))
+    
+    yield db.session
+    
+    db.session.remove()
+    db.session = app_session
+    transaction.rollback()
+    connection.close()
 
 @pytest.fixture
 def sample_media_file(db_session):
@@ -188,43 +235,35 @@ def mock_telegive_service():
         }
         yield mock
 
-@pytest.fixture
-def mock_file_storage():
-    """Mock file storage operations"""
-    with patch('utils.file_storage.file_storage') as mock:
-        mock.save_file_content.return_value = {
+# Default return values for the patched utility singletons, re-applied
+# before every test that uses them
+MOCK_DEFAULTS = {
+    'utils.file_storage.file_storage': {
+        'save_file_content': {
             'success': True,
             'stored_filename': 'test_file_12345_1234567890.jpg',
             'file_path': '/tmp/test_file_12345_1234567890.jpg'
-        }
-        mock.delete_file.return_value = {
+        },
+        'delete_file': {
             'success': True,
             'file_size_freed': 1024000
-        }
-        mock.get_file_info.return_value = {
+        },
+        'get_file_info': {
             'exists': True,
             'file_size': 1024000,
             'mime_type': 'image/jpeg'
         }
-        yield mock
-
-@pytest.fixture
-def mock_security_scanner():
-    """Mock security scanner"""
-    with patch('utils.security_scanner.security_scanner') as mock:
-        mock.is_scanning_enabled.return_value = False
-        mock.scan_file.return_value = {
+    },
+    'utils.security_scanner.security_scanner': {
+        'is_scanning_enabled': False,
+        'scan_file': {
             'safe': True,
             'threats_detected': [],
             'risk_level': 'low'
         }
-        yield mock
-
-@pytest.fixture
-def mock_file_validator():
-    """Mock file validator"""
-    with patch('utils.file_validator.file_validator') as mock:
-        mock.validate_file.return_value = {
+    },
+    'utils.file_validator.file_validator': {
+        'validate_file': {
             'valid': True,
             'file_info': {
                 'filename': 'test_image.jpg',
@@ -235,50 +274,105 @@ def mock_file_validator():
             },
             'errors': []
         }
-        yield mock
-
-@pytest.fixture
-def mock_image_processor():
-    """Mock image processor"""
-    with patch('utils.image_processor.image_processor') as mock:
-        mock.extract_metadata.return_value = {
+    },
+    'utils.image_processor.image_processor': {
+        'extract_metadata': {
             'width': 1920,
             'height': 1080,
             'format': 'JPEG'
-        }
-        mock.validate_image_content.return_value = {
+        },
+        'validate_image_content': {
             'valid': True,
             'width': 1920,
             'height': 1080,
             'format': 'JPEG'
         }
-        yield mock
-
-@pytest.fixture
-def mock_video_processor():
-    """Mock video processor"""
-    with patch('utils.video_processor.video_processor') as mock:
-        mock.extract_metadata.return_value = {
+    },
+    'utils.video_processor.video_processor': {
+        'extract_metadata': {
             'width': 1920,
             'height': 1080,
             'duration': 30.5,
             'format': 'MP4'
-        }
-        mock.validate_video_content.return_value = {
+        },
+        'validate_video_content': {
             'valid': True,
             'width': 1920,
             'height': 1080,
             'duration': 30.5,
             'format': 'MP4'
         }
+    },
+    'utils.file_hasher.file_hasher': {
+        'calculate_hash': 'abcdef1234567890'
+    }
+}
+
+@pytest.fixture(scope='session')
+def session_mocks():
+    """One MagicMock per patched utility, built once for the whole session"""
+    return {target: MagicMock() for target in MOCK_DEFAULTS}
+
+def _patched_mock(session_mocks, target):
+    """Reset a shared mock to its defaults and patch it in for one test
+    
+    Only the mock is shared; the patch itself stays function-scoped so
+    tests that don't ask for it see the real utility.
+    """
+    mock = session_mocks[target]
+    mock.reset_mock(return_value=True, side_effect=True)
+    for method, return_value in MOCK_DEFAULTS[target].items():
+        getattr(mock, method).return_value = copy.deepcopy(return_value)
+    
+    with patch(target, new=mock):
         yield mock
 
 @pytest.fixture
-def mock_file_hasher():
+def mock_file_storage(session_mocks):
+    """Mock file storage operations"""
+    yield from _patched_mock(session_mocks, 'utils.file_storage.file_storage')
+
+@pytest.fixture
+def mock_security_scanner(session_mocks):
+    """Mock security scanner"""
+    yield from _patched_mock(session_mocks, 'utils.security_scanner.security_scanner')
+
+@pytest.fixture
+def mock_file_validator(session_mocks):
+    """Mock file validator"""
+    yield from _patched_mock(session_mocks, 'utils.file_validator.file_validator')
+
+@pytest.fixture
+def mock_image_processor(session_mocks):
+    """Mock image processor"""
+    yield from _patched_mock(session_mocks, 'utils.image_processor.image_processor')
+
+@pytest.fixture
+def mock_video_processor(session_mocks):
+    """Mock video processor"""
+    yield from _patched_mock(session_mocks, 'utils.video_processor.video_processor')
+
+@pytest.fixture
+def mock_file_hasher(session_mocks):
     """Mock file hasher"""
-    with patch('utils.file_hasher.file_hasher') as mock:
-        mock.calculate_hash.return_value = 'abcdef1234567890'
-        yield mock
+    yield from _patched_mock(session_mocks, 'utils.file_hasher.file_hasher')
+
+@pytest.fixture
+def patched_send_file():
+    """Unstarted patcher replacing the media routes' send_file with placeholder content
+    
+    Use it as a context manager around the step that serves the file.
+    """
+    return patch('routes.media.send_file', return_value='file_content')
+
+@pytest.fixture
+def patched_path_exists():
+    """Unstarted patcher reporting every path as present to os.path.exists
+    
+    Use it as a context manager around the step that needs it, so the
+    rest of the test still sees real file-existence checks.
+    """
+    return patch('os.path.exists', return_value=True)
 
 # Test data fixtures
 @pytest.fixture
@@ -3,14 +3,46 @@ import json
 import time
 from unittest.mock import patch
 
+# Validator result for the video upload; the image upload uses the
+# mock_file_validator default
+VIDEO_VALIDATION = {
+    'valid': True,
+    'file_info': {
+        'filename': 'test_video.mp4',
+        'file_size': 2048000,
+        'file_type': 'video',
+        'mime_type': 'video/mp4',
+        'file_extension': 'mp4'
+    },
+    'errors': []
+}
+
+@pytest.fixture
+def upload_fixture(request):
+    """Upload fixture named by the test's parameter"""
+    return request.getfixturevalue(request.param)
+
 class TestCompleteUploadWorkflow:
     """Test complete file upload workflow"""
     
-    def test_complete_image_upload_workflow(self, client, mock_file_upload, 
-                                          sample_upload_data, mock_file_validator,
-                                          mock_image_processor, mock_file_hasher,
-                                          mock_file_storage, mock_security_scanner):
-        """Test complete image upload workflow from start to finish"""
+    @pytest.mark.parametrize('upload_fixture, validation_result, expected_file_info', [
+        ('mock_file_upload', None, {'file_type': 'image'}),
+        ('mock_video_upload', VIDEO_VALIDATION, {
+            'file_type': 'video',
+            'mime_type': 'video/mp4',
+            'duration': 30.5  # From mock
+        })
+    ], indirect=['upload_fixture'], ids=['image', 'video'])
+    def test_complete_upload_workflow(self, client, upload_fixture, validation_result,
+                                      expected_file_info, sample_upload_data,
+                                      mock_file_validator, mock_image_processor,
+                                      mock_video_processor, mock_file_hasher,
+                                      mock_file_storage, mock_security_scanner,
+                                      patched_path_exists, patched_send_file):
+        """Test complete upload workflow from start to finish for each media type"""
+        
+        if validation_result:
+            mock_file_validator.validate_file.return_value = validation_result
         
         # Step 1: Check upload status/configuration
         status_response = client.get('/api/media/upload/status')
@@ -18,30 +50,29 @@ class TestCompleteUploadWorkflow:
         
         # Step 2: Upload file
         data = sample_upload_data.copy()
-        data['file'] = mock_file_upload
+        data['file'] = upload_fixture
         
         upload_response = client.post('/api/media/upload', data=data)
         assert upload_response.status_code == 201
         
-        upload_data = json.loads(upload_response.data)
+        upload_data = upload_response.get_json()
         assert upload_data['success'] is True
         file_id = upload_data['file_info']['id']
         
+        # Verify type-specific metadata
+        for key, value in expected_file_info.items():
+            assert upload_data['file_info'][key] == value
+        
         # Step 3: Verify file info can be retrieved
         info_response = client.get(f'/api/media/{file_id}')
         assert info_response.status_code == 200
         
-        info_data = json.loads(info_response.data)
+        info_data = info_response.get_json()
         assert info_data['file_info']['id'] == file_id
         assert info_data['file_info']['is_validated'] is True
         
         # Step 4: Download file
-        with patch('os.path.exists') as mock_exists, \
-             patch('flask.send_file') as mock_send_file:
-            
-            mock_exists.return_value = True
-            mock_send_file.return_value = 'file_content'
-            
+        with patched_path_exists, patched_send_file as mock_send_file:
             download_response = client.get(f'/api/media/{file_id}/download')
             mock_send_file.assert_called_once()
         
@@ -56,43 +87,9 @@ class TestCompleteUploadWorkflow:
         
         # Step 6: Verify file is scheduled for cleanup
         info_response = client.get(f'/api/media/{file_id}')
-        info_data = json.loads(info_response.data)
+        info_data = info_response.get_json()
         assert info_data['file_info']['cleanup_status'] == 'pending'
     
-    def test_complete_video_upload_workflow(self, client, mock_video_upload,
-                                          sample_upload_data, mock_file_validator,
-                                          mock_video_processor, mock_file_hasher,
-                                          mock_file_storage):
-        """Test complete video upload workflow"""
-        
-        # Configure mocks for video
-        mock_file_validator.validate_file.return_value = {
-            'valid': True,
-            'file_info': {
-                'filename': 'test_video.mp4',
-                'file_size': 2048000,
-                'file_type': 'video',
-                'mime_type': 'video/mp4',
-                'file_extension': 'mp4'
-            },
-            'errors': []
-        }
-        
-        # Upload video file
-        data = sample_upload_data.copy()
-        data['file'] = mock_video_upload
-        
-        upload_response = client.post('/api/media/upload', data=data)
-        assert upload_response.status_code == 201
-        
-        upload_data = json.loads(upload_response.data)
-        file_info = upload_data['file_info']
-        
-        # Verify video-specific metadata
-        assert file_info['file_type'] == 'video'
-        assert file_info['mime_type'] == 'video/mp4'
-        assert file_info['duration'] == 30.5  # From mock
-    
     def test_duplicate_file_handling_workflow(self, client, mock_file_upload,
                                             sample_upload_data, mock_file_validator,
                                             mock_image_processor, mock_file_hasher,
@@ -106,7 +103,7 @@ class TestCompleteUploadWorkflow:
         first_response = client.post('/api/media/upload', data=data)
         assert first_response.status_code == 201
         
-        first_data = json.loads(first_response.data)
+        first_data = first_response.get_json()
         first_file_id = first_data['file_info']['id']
         
         # Reset file stream for second upload
@@ -116,7 +113,7 @@ class TestCompleteUploadWorkflow:
         second_response = client.post('/api/media/upload', data=data)
         assert second_response.status_code == 200  # 200 for duplicate
         
-        second_data = json.loads(second_response.data)
+        second_data = second_response.get_json()
         assert second_data['duplicate_detected'] is True
         assert second_data['existing_file_id'] == first_file_id
 
@@ -137,13 +134,13 @@ class TestCompleteCleanupWorkflow:
         cleanup_response = client.post(f'/api/media/cleanup/{giveaway_id}')
         assert cleanup_response.status_code == 200
         
-        cleanup_data = json.loads(cleanup_response.data)
+        cleanup_data = cleanup_response.get_json()
         assert cleanup_data['success'] is True
         assert cleanup_data['cleanup_summary']['files_processed'] >= 1
         
         # Step 3: Verify file is marked as cleaned up
         info_response = client.get(f'/api/media/{sample_media_file.id}')
-        info_data = json.loads(info_response.data)
+        info_data = info_response.get_json()
         assert info_data['file_info']['is_active'] is False
         assert info_data['file_info']['cleanup_status'] == 'published_and_removed'
         
@@ -161,20 +158,20 @@ class TestCompleteCleanupWorkflow:
         info_response = client.get(f'/api/media/{file_id}')
         assert info_response.status_code == 200
         
-        info_data = json.loads(info_response.data)
+        info_data = info_response.get_json()
         assert info_data['file_info']['is_active'] is True
         
         # Step 2: Delete file manually
         delete_response = client.delete(f'/api/media/{file_id}')
         assert delete_response.status_code == 200
         
-        delete_data = json.loads(delete_response.data)
+        delete_data = delete_response.get_json()
         assert delete_data['success'] is True
         assert 'space_freed' in delete_data
         
         # Step 3: Verify file is marked as inactive
         info_response = client.get(f'/api/media/{file_id}')
-        info_data = json.loads(info_response.data)
+        info_data = info_response.get_json()
         assert info_data['file_info']['is_active'] is False
         
         # Step 4: Verify file download returns 410 Gone
@@ -196,7 +193,7 @@ class TestAccountManagementWorkflow:
         files_response = client.get(f'/api/media/account/{account_id}')
         assert files_response.status_code == 200
         
-        initial_data = json.loads(files_response.data)
+        initial_data = files_response.get_json()
         initial_count = len(initial_data['files'])
         
         # Step 2: Upload multiple files
@@ -214,26 +211,26 @@ class TestAccountManagementWorkflow:
             upload_response = client.post('/api/media/upload', data=data)
             assert upload_response.status_code == 201
             
-            upload_data = json.loads(upload_response.data)
+            upload_data = upload_response.get_json()
             file_ids.append(upload_data['file_info']['id'])
         
         # Step 3: Verify all files appear in account listing
         files_response = client.get(f'/api/media/account/{account_id}')
-        files_data = json.loads(files_response.data)
+        files_data = files_response.get_json()
         
         assert len(files_data['files']) == initial_count + 3
         assert files_data['storage_stats']['active_files'] >= 3
         
         # Step 4: Test pagination
         paginated_response = client.get(f'/api/media/account/{account_id}?page=1&limit=2')
-        paginated_data = json.loads(paginated_response.data)
+        paginated_data = paginated_response.get_json()
         
         assert len(paginated_data['files']) <= 2
         assert paginated_data['pagination']['limit'] == 2
         
         # Step 5: Test status filtering
         active_response = client.get(f'/api/media/account/{account_id}?status=active')
-        active_data = json.loads(active_response.data)
+        active_data = active_response.get_json()
         
         for file_info in active_data['files']:
             assert file_info['is_active'] is True
@@ -243,7 +240,7 @@ class TestAccountManagementWorkflow:
         assert delete_response.status_code == 200
         
         inactive_response = client.get(f'/api/media/account/{account_id}?status=inactive')
-        inactive_data = json.loads(inactive_response.data)
+        inactive_data = inactive_response.get_json()
         
         assert len(inactive_data['files']) >= 1
         for file_info in inactive_data['files']:
@@ -269,7 +266,7 @@ class TestErrorRecoveryWorkflows:
         failed_response = client.post('/api/media/upload', data=data)
         assert failed_response.status_code == 400
         
-        failed_data = json.loads(failed_response.data)
+        failed_data = failed_response.get_json()
         assert failed_data['error_code'] == 'VALIDATION_FAILED'
         
         # Step 2: Fix validation and retry
@@ -291,7 +288,7 @@ class TestErrorRecoveryWorkflows:
         success_response = client.post('/api/media/upload', data=data)
         assert success_response.status_code == 201
         
-        success_data = json.loads(success_response.data)
+        success_data = success_response.get_json()
         assert success_data['success'] is True
     
     def test_storage_failure_recovery(self, client, mock_file_upload,
@@ -311,7 +308,7 @@ class TestErrorRecoveryWorkflows:
         failed_response = client.post('/api/media/upload', data=data)
         assert failed_response.status_code == 500
         
-        failed_data = json.loads(failed_response.data)
+        failed_data = failed_response.get_json()
         assert failed_data['error_code'] == 'STORAGE_FAILED'
         
         # Step 2: Storage recovers
@@ -327,7 +324,7 @@ class TestErrorRecoveryWorkflows:
         success_response = client.post('/api/media/upload', data=data)
         assert success_response.status_code == 201
         
-        success_data = json.loads(success_response.data)
+        success_data = success_response.get_json()
         assert success_data['success'] is True
 
 class TestSecurityWorkflows:
@@ -367,7 +364,7 @@ class TestSecurityWorkflows:
         malicious_response = client.post('/api/media/upload', data=data)
         assert malicious_response.status_code == 400
         
-        malicious_data = json.loads(malicious_response.data)
+        malicious_data = malicious_response.get_json()
         assert malicious_data['error_code'] == 'SECURITY_SCAN_FAILED'
         assert 'threats' in malicious_data['details']
 
@@ -401,7 +398,7 @@ class TestPerformanceWorkflows:
         cleanup_response = client.post(f'/api/media/cleanup/{giveaway_id}')
         assert cleanup_response.status_code == 200
         
-        cleanup_data = json.loads(cleanup_response.data)
+        cleanup_data = cleanup_response.get_json()
         assert cleanup_data['success'] is True
         
         # Verify cleanup summary contains expected fields
@@ -421,20 +418,20 @@ class TestIntegrationWithExternalServices:
         health_response = client.get('/health')
         assert health_response.status_code == 200
         
-        health_data = json.loads(health_response.data)
+        health_data = health_response.get_json()
         assert health_data['status'] == 'healthy'
         
         # Step 2: Detailed health check
         detailed_response = client.get('/health/detailed')
         assert detailed_response.status_code == 200
         
-        detailed_data = json.loads(detailed_response.data)
+        detailed_data = detailed_response.get_json()
         assert 'checks' in detailed_data
         assert 'database' in detailed_data['checks']
     
     @patch('services.telegive_service.telegive_service')
     def test_giveaway_service_integration_workflow(self, mock_telegive, client,
-                                                  sample_media_file):
+                                                  sample_media_file, mock_file_storage):
         """Test integration with giveaway service"""
         
         # Mock giveaway service responses
@@ -452,13 +449,8 @@ class TestIntegrationWithExternalServices:
         )
         assert associate_response.status_code == 200
         
-        # Step 2: Delete file (should notify giveaway service)
-        with patch('utils.file_storage.file_storage') as mock_storage:
-            mock_storage.delete_file.return_value = {
-                'success': True,
-                'file_size_freed': 1024000
-            }
-            
-            delete_response = client.delete(f'/api/media/{file_id}')
-            assert delete_response.status_code == 200
+        # Step 2: Delete file (should notify giveaway service); file storage
+        # deletion comes from the mock_file_storage defaults
+        delete_response = client.delete(f'/api/media/{file_id}')
+        assert delete_response.status_code == 200
 
@@ -0,0 +1,103 @@
+import importlib
+import os
+import sys
+import pytest
+from io import BytesIO
+
+PNG_DATA = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde\x00\x00\x00\tpHYs\x00\x00\x0b\x13\x00\x00\x0b\x13\x01\x00\x9a\x9c\x18\x00\x00\x00\nIDATx\x9cc\xf8\x00\x00\x00\x01\x00\x01\x00\x00\x00\x00IEND\xaeB`\x82'
+
+@pytest.fixture
+def standalone_app(monkeypatch, tmp_path):
+    """Import the standalone service against an in-memory database"""
+    monkeypatch.setenv('DATABASE_URL', 'sqlite://')
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path))
+    
+    # Fresh import so the module reads the env above; monkeypatch puts
+    # back whatever was imported before once the test is done
+    monkeypatch.delitem(sys.modules, 'test_app', raising=False)
+    module = importlib.import_module('test_app')
+    
+    # Token "account-<id>" authenticates as that account
+    monkeypatch.setattr(module, 'verify_auth_token', lambda token: {
+        'valid': True,
+        'user_id': 1,
+        'account_id': int(token.split('-')[1])
+    })
+    
+    with module.app.app_context():
+        module.db.create_all()
+        yield module
+    
+    sys.modules.pop('test_app', None)
+
+def upload(client, account_id, data=PNG_DATA):
+    return client.post(
+        '/api/upload',
+        data={'file': (BytesIO(data), 'image.png')},
+        headers={'Authorization': f'Bearer account-{account_id}'},
+        content_type='multipart/form-data'
+    )
+
+class TestSharedContentStorage:
+    """Rows with identical content must not share a file on disk"""
+    
+    def test_same_content_gets_separate_files(self, standalone_app):
+        """Deleting one row's file leaves other rows with the same bytes intact"""
+        client = standalone_app.app.test_client()
+        
+        # Same bytes from two accounts, then a soft delete and re-upload
+        first = upload(client, 1).get_json()['file']
+        second = upload(client, 2).get_json()['file']
+        
+        delete_response = client.delete(
+            f"/api/files/{first['id']}", headers={'Authorization': 'Bearer account-1'}
+        )
+        assert delete_response.status_code == 200
+        
+        third_response = upload(client, 1)
+        assert third_response.status_code == 201
+        third = third_response.get_json()['file']
+        
+        assert first['file_hash'] == second['file_hash'] == third['file_hash']
+        
+        rows = {
+            row.id: row for row in standalone_app.MediaFile.query.filter(
+                standalone_app.MediaFile.id.in_([first['id'], second['id'], third['id']])
+            )
+        }
+        paths = {row.file_path for row in rows.values()}
+        assert len(paths) == 3
+        
+        # What cleanup of the soft-deleted row does to its file
+        os.remove(rows[first['id']].file_path)
+        
+        for file_id, account_id in ((second['id'], 2), (third['id'], 1)):
+            assert os.path.exists(rows[file_id].file_path)
+            
+            download_response = client.get(
+                f'/api/files/{file_id}/download',
+                headers={'Authorization': f'Bearer account-{account_id}'}
+            )
+            assert download_response.status_code == 200
+            assert download_response.data == PNG_DATA
+
+class TestUploadFailureCleanup:
+    """A failed upload must not leave files behind"""
+    
+    def test_failed_commit_removes_stored_file(self, standalone_app, monkeypatch, tmp_path):
+        """The stored file goes away when its row is never committed"""
+        client = standalone_app.app.test_client()
+        
+        def failing_commit():
+            raise RuntimeError('database went away')
+        
+        monkeypatch.setattr(standalone_app.db.session, 'commit', failing_commit)
+        
+        response = upload(client, 1)
+        assert response.status_code == 500
+        
+        leftovers = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(tmp_path) for name in names
+        ]
+        assert leftovers == []
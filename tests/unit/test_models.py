@@ -297,3 +297,29 @@ class TestModelValidation:
         # Both files should exist
         assert MediaFile.query.filter_by(file_hash='same_hash').count() == 2
 
+class TestDbSessionIsolation:
+    """Test that db_session rolls back each test's commits"""
+    
+    def test_commit_row(self, db_session):
+        """Commit a row for the next test to look for"""
+        media_file = MediaFile(
+            account_id=24680,
+            original_filename='isolation.jpg',
+            stored_filename='isolation_24680.jpg',
+            file_path='/tmp/isolation_24680.jpg',
+            file_size=1024,
+            file_type='image',
+            mime_type='image/jpeg',
+            file_extension='jpg',
+            file_hash='isolation_hash',
+            uploaded_by_ip='127.0.0.1'
+        )
+        
+        db_session.add(media_file)
+        db_session.commit()
+        
+        assert MediaFile.query.filter_by(file_hash='isolation_hash').count() == 1
+    
+    def test_row_from_previous_test_is_gone(self, db_session):
+        """The row committed by the previous test was rolled back"""
+        assert MediaFile.query.filter_by(file_hash='isolation_hash').count() == 0
@@ -191,6 +191,12 @@ class TestFileHasher:
         finally:
             os.unlink(temp_file_path)
     
+    def test_calculate_hash_from_file_object(self):
+        """Test hashing an open file matches hashing its content"""
+        content = b'test file content'
+        
+        assert file_hasher.calculate_hash(BytesIO(content)) == file_hasher.calculate_hash(content)
+    
     def test_calculate_hash_consistency(self):
         """Test hash calculation consistency"""
         content = b'consistent content'
@@ -14,7 +14,7 @@ class FileHasher:
         Calculate hash of file content
         
         Args:
-            file_path_or_content: File path string or bytes content
+            file_path_or_content: File path string, bytes content, or binary file object
             algorithm: Hash algorithm ('sha256', 'md5', 'sha1')
         
         Returns:
@@ -27,16 +27,23 @@ class FileHasher:
             hasher = hashlib.new(algorithm)
             
             if isinstance(file_path_or_content, str):
-                # File path - read in chunks for memory efficiency
+                # File path - file_digest streams through a large reusable
+                # buffer straight into OpenSSL (SHA-NI where available)
                 with open(file_path_or_content, 'rb') as f:
+                    if hasattr(hashlib, 'file_digest'):
+                        return hashlib.file_digest(f, algorithm).hexdigest()
                     while chunk := f.read(self.chunk_size):
                         hasher.update(chunk)
-            else:
-                # Bytes content - process in chunks
-                content = file_path_or_content
-                for i in range(0, len(content), self.chunk_size):
-                    chunk = content[i:i + self.chunk_size]
+            elif hasattr(file_path_or_content, 'read'):
+                # Open file - stream from its current position
+                if hasattr(hashlib, 'file_digest'):
+                    return hashlib.file_digest(file_path_or_content, algorithm).hexdigest()
+                while chunk := file_path_or_content.read(self.chunk_size):
                     hasher.update(chunk)
+            else:
+                # Bytes content is already in memory - hash it in one call
+                # rather than copying it out slice by slice
+                hasher.update(file_path_or_content)
             
             return hasher.hexdigest()
             
@@ -233,7 +233,8 @@ class ImageProcessor:
         Validate image content and extract basic info
         
         Args:
-            file_content: Image file content as bytes
+            file_content: Image file content as bytes, a file path, or a
+                seekable binary file object (decoded lazily, not read into memory)
         
         Returns:
             dict: Validation result with image info
@@ -246,14 +247,20 @@ class ImageProcessor:
             'error': None
         }
         
+        if isinstance(file_content, bytes):
+            file_content = io.BytesIO(file_content)
+        
         try:
-            with Image.open(io.BytesIO(file_content)) as img:
+            with Image.open(file_content) as img:
                 # Verify image can be loaded
                 img.verify()
-                
-                # Re-open for metadata (verify() closes the image)
-                img = Image.open(io.BytesIO(file_content))
-                
+            
+            # Re-open for metadata (verify() leaves the image unusable);
+            # opening only parses the header
+            if hasattr(file_content, 'seek'):
+                file_content.seek(0)
+            
+            with Image.open(file_content) as img:
                 result.update({
                     'valid': True,
                     'width': img.width,
@@ -1,8 +1,13 @@
+import logging
 import os
 import re
 import magic
 from flask import current_app
 
+# Not current_app.logger: scan_file also runs in process pool workers,
+# which have no app context
+logger = logging.getLogger(__name__)
+
 class SecurityScanner:
     """Security scanning utilities for uploaded files"""
     
@@ -131,7 +136,7 @@ class SecurityScanner:
             }
             
         except Exception as e:
-            current_app.logger.error(f'Security scan error: {e}')
+            logger.error(f'Security scan error: {e}')
             result.update({
                 'safe': False,
                 'threats_detected': [f'Scan error: {str(e)}'],
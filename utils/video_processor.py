@@ -123,7 +123,7 @@ class VideoProcessor:
         Validate video content using ffprobe
         
         Args:
-            file_content: Video file content as bytes
+            file_content: Video file path string, or content as bytes
         
         Returns:
             dict: Validation result with video info
@@ -145,13 +145,18 @@ class VideoProcessor:
         
         temp_file = None
         try:
-            # Write content to temp file for ffprobe
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.tmp')
-            temp_file.write(file_content)
-            temp_file.close()
+            if isinstance(file_content, bytes):
+                # Write content to temp file for ffprobe
+                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.tmp')
+                temp_file.write(file_content)
+                temp_file.close()
+                file_path = temp_file.name
+            else:
+                # ffprobe reads only the headers it needs from the file itself
+                file_path = file_content
             
             # Extract metadata
-            metadata = self._extract_ffprobe_data(temp_file.name)
+            metadata = self._extract_ffprobe_data(file_path)
             
             # Check if we got valid video data
             if metadata.get('width') and metadata.get('height'):